@@ -22,9 +22,13 @@ For examples of how to use the code, see the [test functions](tests).
 from .lib import *
 from .col import *
 from .tab import *
+from .store import *
+from .bits import *
+from .ingest import *
 from .my import *
 from .rx import *
 from .ranges import *
 from .xomo import *
 from .test import Test, go
+from .bench import Bench, bench
 from .tests import *
@@ -20,5 +20,7 @@ if my.T:
   sys.exit(abs(Test.f - 1))
 elif my.t:
   go(use=my.t)
+elif my.B:
+  Bench.go(use=my.B, n=my.Bn)
 else:
   my.L: Test.list()
@@ -69,8 +69,10 @@ basic containers for things with names slots (but no methods).
            Sym(mode)
         Cols          :has 1 :to * :of Col
         Dist          :has 1 :to 1 :of Tab
+        Index(n)      :has 1 :to * :of bitset
         Range(lo,hi)
         Ranges        :has 1 :to * :of Range
+        Store(n)      :has 1 :to * :of array
         Tab(rows)     :has 1 :to 1 :of Cols
         Test
 
@@ -86,7 +88,8 @@ Each row is some example of `y=f(x)` where `y` and `x`
 can have multiple values (and when `|y|>1`, then this
 then becomes a multi-objective reasoner).
 
-Our  `rows` are just plain old Python lists. We can
+Our  `rows` are just plain old Python lists (or, for
+big tables, a columnar `Store` of typed arrays). We can
 compute the `dist`ance between rows as well as checking
 if the goals in one row are "better than" (also known as
 "dominates") the other.
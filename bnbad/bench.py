@@ -0,0 +1,484 @@
+"""
+Benchmarks. Like the [tests](tests), these are registered by a
+decorator (`@bench`) and run from the command line:
+
+    python3 -m bnbad -B NAME [-Bn ROWS]
+
+runs all the benchmarks whose names match `NAME` on data sets of
+(about) `ROWS` rows.
+"""
+from .my import my
+from .lib import cols, rows, o
+from .ingest import batches
+import os
+import random
+import re
+import tempfile
+import time
+
+
+def bench(fn):
+  """
+  Decorator for benchmark functions.
+  Adds the function to `Bench.all`.
+  """
+  Bench.all[fn.__name__] = fn
+  return fn
+
+
+class Bench:
+  "Stores all the benchmarks in `Bench.all`. Runs some of them."
+  all = {}
+
+  def go(use="", n=my.Bn):
+    [Bench.run(f, n) for k, f in Bench.all.items() if use in k]
+
+  def run(fun, n):
+    random.seed(my.r)
+    doc = (fun.__doc__ or "").strip().split("\n")[0]
+    print(f"# {re.sub(r'bench_', '', fun.__name__)}: {doc}")
+    fun(n)
+
+
+def timed(f, *lst, **kw):
+  "Return seconds taken to run `f`, and what `f` returned."
+  t0 = time.perf_counter()
+  out = f(*lst, **kw)
+  return time.perf_counter() - t0, out
+
+
+def scaled(txt, n):
+  """
+  Write a temporary csv file with the header of `txt`, then
+  `n` rows copied (over and over) from the body of `txt`.
+  Return its path.
+  """
+  head, *body = [s for s in txt.strip().splitlines() if s.strip()]
+  fd, path = tempfile.mkstemp(suffix=".csv")
+  with os.fdopen(fd, "w") as fp:
+    fp.write(head + "\n")
+    for k in range(n):
+      fp.write(body[k % len(body)] + "\n")
+  return path
+
+
+@bench
+def bench_ingest(n):
+  "MB/s of `rows`/`cols` vs bulk `batches`, on auto93 scaled to n rows."
+  from .data import auto93
+  path = scaled(auto93, n)
+  mb = os.path.getsize(path) / 2**20
+
+  def old():
+    return sum(1 for _ in cols(rows(path)))
+
+  def new():
+    return sum(len(b) for b in batches(path))
+  try:
+    t1, n1 = timed(old)
+    t2, n2 = timed(new)
+    assert n1 == n2, "readers disagree"
+    print(f"  rows    {n1 - 1:>10,}  {mb:8.1f} MB")
+    print(f"  rows()  {t1:8.2f} s  {mb / t1:8.1f} MB/s")
+    print(f"  batches {t2:8.2f} s  {mb / t2:8.1f} MB/s")
+    print(f"  speedup {t1 / t2:8.2f} x")
+  finally:
+    os.remove(path)
+
+
+@bench
+def bench_schema(n):
+  "Cost of `clone` (header re-parse vs shared `Schema`) and `Tree` build."
+  from .tab import Tab, Tree
+  from .col import Cols
+  t = Tab()
+  head = [f"$x{k}" for k in range(300)] + ["<g0", ">g1", ">g2"]
+  t + head
+  for _ in range(min(n, 2000)):
+    t + [random.random() for _ in head]
+  names = t.cols.schema.names
+  t1, _ = timed(lambda: [Cols().header(names) for _ in range(1000)])
+  t2, _ = timed(lambda: [Cols(t.cols.schema) for _ in range(1000)])
+  t3, tree = timed(Tree, t)
+  print(f"  columns {len(head):>8}  rows {len(t.rows):,}")
+  print(f"  1000 headers  {t1:8.3f} s")
+  print(f"  1000 schemas  {t2:8.3f} s  ({t1 / t2:.1f} x)")
+  print(f"  Tree(t)       {t3:8.3f} s  ({len(tree.leaves)} leaves)")
+
+
+@bench
+def bench_dists(n):
+  "Scalar `Dist.dist` vs batch `Dist.dists` (auto93 scaled to n rows)."
+  from .data import auto93
+  from .tab import Tab, Dist
+  path = scaled(auto93, min(n, 10**5))
+  try:
+    t = Tab().read(path)
+  finally:
+    os.remove(path)
+  d = Dist(t)
+  some = t.rows[:10]
+  t1, _ = timed(lambda: [[d.dist(r1, r2) for r2 in t.rows] for r1 in some])
+  t2, _ = timed(lambda: [d.dists(r1, t.rows) for r1 in some])
+  m = d.prep(t.rows)
+  t3, _ = timed(lambda: [d.kernel([x[0] for x in d.prep([r1])], m)
+                         for r1 in some])
+  k = len(some) * len(t.rows)
+  print(f"  pairs   {k:>10,}")
+  print(f"  dist    {t1:8.2f} s  {k / t1:12,.0f} pairs/s")
+  print(f"  dists   {t2:8.2f} s  {k / t2:12,.0f} pairs/s")
+  print(f"  kernel  {t3:8.2f} s  {k / t3:12,.0f} pairs/s (rows prepared once)")
+
+
+@bench
+def bench_vptree(n):
+  "Full scans vs a `VpTree`, for nearest and far rows (n rows)."
+  from .data import auto93
+  from .tab import Tab, Dist
+  path = scaled(auto93, min(n, 2 * 10**4))
+  try:
+    t = Tab().read(path)
+  finally:
+    os.remove(path)
+  for row in t.rows:
+    row[1] += random.random()  # so rows are not all repeats
+  d = Dist(t, rows=t.rows)
+  t0, vp = timed(Dist, t, rows=t.rows, index=True)
+  some = t.rows[:20]
+  t1, _ = timed(lambda: [d.neighbors(r)[:5] for r in some])
+  t2, _ = timed(lambda: [vp.nearest(r, 5) for r in some])
+  t3, _ = timed(lambda: [d.faraway(r) for r in some])
+  t4, _ = timed(lambda: [vp.faraway(r) for r in some])
+  print(f"  rows {len(t.rows):,}   queries {len(some)}")
+  print(f"  build index {t0:8.2f} s")
+  print(f"  nearest     scan {t1:8.2f} s   index {t2:8.2f} s")
+  print(f"  faraway     scan {t3:8.2f} s   index {t4:8.2f} s")
+
+
+@bench
+def bench_tree(n):
+  "`Tree(t, jobs=1)` vs `Tree(t, jobs=N)` for N cores (n rows)."
+  from .data import auto93
+  from .tab import Tab, Tree
+  path = scaled(auto93, n)
+  try:
+    t = Tab().read(path)
+  finally:
+    os.remove(path)
+  for row in t.rows:
+    row[1] += random.random()  # so rows are not all repeats
+  jobs = os.cpu_count() or 1
+  t1, one = timed(Tree, t, jobs=1, seeded=True)
+  t2, many = timed(Tree, t, jobs=jobs, seeded=True)
+  assert len(one.leaves) == len(many.leaves), "trees differ"
+  print(f"  rows {len(t.rows):,}   leaves {len(one.leaves):,}")
+  print(f"  jobs=1   {t1:8.2f} s")
+  print(f"  jobs={jobs:<3} {t2:8.2f} s  ({t1 / t2:.2f} x)")
+
+
+@bench
+def bench_insert(n):
+  "Rebuilding a `Tree` vs `Tree.insert` of the last 1% of n rows."
+  from .data import auto93
+  from .tab import Tab, Tree
+  path = scaled(auto93, n)
+  try:
+    t = Tab().read(path)
+  finally:
+    os.remove(path)
+  for row in t.rows:
+    row[1] += random.random()  # so rows are not all repeats
+  old, new = t.rows[:-(n // 100)], t.rows[-(n // 100):]
+  t1, _ = timed(Tree, t, jobs=1)
+  tree = Tree(t.clone(old), jobs=1)
+  t2, _ = timed(lambda: [tree.insert(row) for row in new])
+  t3, _ = timed(tree.insert_many, new)
+  print(f"  rows {len(t.rows):,}   new rows {len(new):,}")
+  print(f"  rebuild      {t1:8.2f} s")
+  print(f"  insert       {t2:8.2f} s  {len(new) / t2:10,.0f} rows/s")
+  print(f"  insert_many  {t3:8.2f} s  {len(new) / t3:10,.0f} rows/s")
+
+
+@bench
+def bench_route(n):
+  "Rows/sec routed to leaves by a `Router` (from `Tree.export`)."
+  from .data import auto93
+  from .tab import Tab, Tree, Router
+  path = scaled(auto93, n)
+  try:
+    t = Tab().read(path)
+  finally:
+    os.remove(path)
+  for row in t.rows:
+    row[1] += random.random()  # so rows are not all repeats
+  tree = Tree(t.clone(t.rows[:10**4]), jobs=1)
+  fd, out = tempfile.mkstemp(suffix=".json")
+  os.close(fd)
+  try:
+    tree.export(out)
+    kb = os.path.getsize(out) / 1024
+    r = Router.load(out)
+  finally:
+    os.remove(out)
+  t1, ids = timed(r.route, t.rows)
+  print(f"  leaves {len(r.leaves):,}   export {kb:.1f} KB")
+  print(f"  rows   {len(ids):,}")
+  print(f"  route  {t1:8.2f} s  {len(ids) / t1:10,.0f} rows/s")
+
+
+@bench
+def bench_rank(n):
+  "Ranking 2000 leaves: pairs of `better` vs `Tree.rank` vs `fronts`."
+  from .tab import Tab, Tree, TabView
+  t = Tab()
+  t + ["$x", "<g0", ">g1", ">g2"]
+  for _ in range(min(n, 10**4)):
+    t + [random.random() for _ in range(4)]
+  tree = Tree.__new__(Tree)
+  tree.root = o(t=t)
+  tree.leaves = [o(t=TabView(t, range(k, k + 5)))
+                 for k in range(0, min(len(t.rows), 10**4), 5)]
+  mids = [j.t.mid() for j in tree.leaves]
+
+  def old():
+    for j in tree.leaves:
+      j.dom = sum([t.better(j.t.mid(), k.t.mid()) for k in tree.leaves])
+
+  def nds():
+    most, my.nds = my.nds, 0
+    try:
+      tree.rank()
+    finally:
+      my.nds = most
+  t1, _ = timed(old)
+  want = [j.dom for j in tree.leaves]
+  t2, _ = timed(tree.rank)
+  same = want == [j.dom for j in tree.leaves]
+  t3, _ = timed(nds)
+  print(f"  leaves {len(mids):,}")
+  print(f"  better  {t1:8.2f} s")
+  print(f"  rank    {t2:8.2f} s  ({t1 / t2:.1f} x, same = {same})")
+  print(f"  fronts  {t3:8.2f} s  ({t1 / t3:.1f} x)")
+
+
+@bench
+def bench_dom(n):
+  "Rows/sec for `Tab.dom_counts`, exact (on 2000 rows) and sampled."
+  from .data import auto93
+  from .tab import Tab
+  path = scaled(auto93, n)
+  try:
+    t = Tab().read(path)
+  finally:
+    os.remove(path)
+  some = t.rows[:2000]
+  t1, _ = timed(lambda: [sum([t.better(r1, r2) for r2 in some])
+                         for r1 in some])
+  t2, _ = timed(t.dom_counts, some)
+  t3, _ = timed(t.dom_counts, sample=100)
+  print(f"  exact, {len(some):,} rows")
+  print(f"    better      {t1:8.2f} s  {len(some) / t1:10,.0f} rows/s")
+  print(f"    dom_counts  {t2:8.2f} s  {len(some) / t2:10,.0f} rows/s")
+  print(f"  sample=100, {len(t.rows):,} rows")
+  print(f"    dom_counts  {t3:8.2f} s  {len(t.rows) / t3:10,.0f} rows/s")
+
+
+@bench
+def bench_decisions(n):
+  "`DecisionList` build time: presorted columns, and one job per core."
+  from .tab import Tab, DecisionList
+  from .tests import _Unsorted
+  head = [f"$x{k}" for k in range(20)] + [">y"]
+  ok, bad = Tab(), Tab()
+  ok + head
+  bad + head
+  for k in range(min(n, 10**5)):
+    row = [random.random() for _ in head]
+    if k % 5:
+      bad + ([0.2 + 0.8 * x for x in row[:4]] + row[4:])
+    else:  # ok rows are low in x0, else x1, else x2, else x3
+      j = 0
+      while j < 3 and random.random() > 0.6:
+        j += 1
+      row[j] *= 0.2
+      ok + row
+  jobs = os.cpu_count() or 1
+  t1, d1 = timed(_Unsorted, ok, bad)
+  t2, d2 = timed(DecisionList, ok, bad)
+  t3, d3 = timed(DecisionList, ok, bad, jobs=jobs)
+  while d1.kid:
+    assert d1.decide.lo == d2.decide.lo == d3.decide.lo, "decisions differ"
+    d1, d2, d3 = d1.kid, d2.kid, d3.kid
+  print(f"  rows {len(ok.rows) + len(bad.rows):,}   columns {len(head)}")
+  print(f"  sort each level  {t1:8.2f} s")
+  print(f"  presorted        {t2:8.2f} s  ({t1 / t2:.2f} x)")
+  print(f"  jobs={jobs:<3}         {t3:8.2f} s  ({t1 / t3:.2f} x)")
+
+
+@bench
+def bench_compile(n):
+  "Rows/sec scored by a `DecisionList`: walked, compiled, columnar."
+  from .data import auto93
+  from .tab import Tab, Tree, DecisionList
+  best, rest, _ = Tree(Tab().read(auto93)).bore()
+  d = DecisionList(best, rest)
+  path = scaled(auto93, n)
+  try:
+    t = Tab().read(path)
+  finally:
+    os.remove(path)
+  c = Tab(columnar=True)
+  c + t.cols.schema.names
+  [c + row for row in t.rows]
+
+  def walk(row):
+    k, one = 0, d
+    while one.kid and not one.decide.matches(row):
+      k, one = k + 1, one.kid
+    return k
+  f = d.compile()
+  t1, want = timed(lambda: [walk(row) for row in t.rows])
+  t2, got2 = timed(f, t.rows)
+  t3, got3 = timed(f, c)
+  assert want == got2 == got3, "leaves differ"
+  m = len(t.rows)
+  print(f"  rows {m:,}   rules {len(d.rules())}")
+  print(f"  walk      {t1:8.2f} s  {m / t1:12,.0f} rows/s")
+  print(f"  compiled  {t2:8.2f} s  {m / t2:12,.0f} rows/s")
+  print(f"  columnar  {t3:8.2f} s  {m / t3:12,.0f} rows/s")
+
+
+@bench
+def bench_bits(n):
+  "Rows in ranges: row scans vs bitmap indexes (auto93 scaled to n rows)."
+  from .data import auto93
+  from .tab import Tab
+  from .bits import Index, popcount
+  path = scaled(auto93, n)
+  old, my.q = my.q, "sketch"
+  try:
+    t = Tab().read(path)
+  finally:
+    my.q = old
+    os.remove(path)
+  nums = [c for c in t.cols.x.values() if c.txt[0] == "$"][:2]
+  rules = [(c.pos, c.quantile(.2), c.quantile(.8), True) for c in nums]
+
+  def scan():
+    return sum(1 for row in t.rows
+               if all(row[pos] != "?" and lo <= row[pos] <= hi
+                      for pos, lo, hi, _ in rules))
+  t0, idx = timed(Index, t.rows)
+  t1, _ = timed(lambda: [idx.sorts(pos) for pos, *_ in rules])
+  t2, want = timed(scan)
+  t3, got = timed(lambda: popcount(idx.where(rules)))
+  t4, _ = timed(lambda: popcount(idx.where(rules)))
+  assert want == got, "counts differ"
+  print(f"  rows {len(t.rows):,}   rules {len(rules)}   matches {got:,}")
+  print(f"  sort columns (once)  {t0 + t1:8.3f} s")
+  print(f"  row scan             {t2:8.3f} s")
+  print(f"  bitmaps              {t3:8.3f} s  ({t2 / t3:.1f} x)")
+  print(f"  bitmaps, again       {t4:8.3f} s  ({t2 / t4:.0f} x)")
+
+
+@bench
+def bench_ranges(n):
+  "`Ranges` of n numbers: bins as `Range` objects vs parallel arrays."
+  from .ranges import Ranges
+  a = [[random.random(), random.random() < 0.3] for _ in range(n)]
+  for x in a:
+    x[1] = x[1] or x[0] < 0.2
+
+  def run(how):
+    old, my.R = my.R, how
+    try:
+      return [(r.lo, r.hi, r.n) for r in Ranges("$x", a).ranges]
+    finally:
+      my.R = old
+  t1, want = timed(run, "objects")
+  t2, got = timed(run, "arrays")
+  assert want == got, "ranges differ"
+  print(f"  values {n:,}   ranges {len(got)}")
+  print(f"  objects  {t1:8.2f} s")
+  print(f"  arrays   {t2:8.2f} s  ({t1 / t2:.1f} x)")
+
+
+@bench
+def bench_merge(n):
+  "Merging the bins of `Ranges`: in passes vs best first from a heap."
+  from .ranges import Ranges
+  import math
+  a = [(x, random.random() < 0.5 + 0.45 * math.sin(x / 40))
+       for x in (random.random() * 1000 for _ in range(n))]
+  a.sort(key=lambda z: z[0])
+
+  def run(how):
+    old, my.Rm = my.Rm, how
+    try:
+      r = Ranges("$x", a, presorted=True)
+      return r.ranges, max(one.s() for one in r.ranges)
+    finally:
+      my.Rm = old
+  print(f"  values {n:,}")
+  for how in ["passes", "heap"]:
+    t, (ranges, best) = timed(run, how)
+    print(f"  {how:7} {t:8.2f} s  ranges {len(ranges):4}  best s() {best:.3f}")
+
+
+@bench
+def bench_stream(n):
+  "Discretizing: all values at once vs streamed into bounded bins."
+  from .ranges import Ranges, Stream
+  import math
+  a = [(x, random.random() < 0.5 + 0.45 * math.sin(x / 40))
+       for x in (random.random() * 1000 for _ in range(n))]
+
+  def stream():
+    s = Stream("$x")
+    for x, y in a:
+      s.add(x, y)
+    return s
+  print(f"  values {n:,}")
+  for what, f in [("batch", lambda: Ranges("$x", a)), ("stream", stream)]:
+    t, r = timed(f)
+    best, m = max(one.s() for one in r.ranges), len(r.ranges)
+    print(f"  {what:6} {t:7.2f} s  ranges {m:4}  best s() {best:.3f}")
+
+
+@bench
+def bench_many(n):
+  "Ranges for several goals: one goal at a time vs all in one sort."
+  from .ranges import Ranges
+  goals = "abcdefgh"
+  a = [(x, goals[int(x * len(goals)) if random.random() < .8 else 0])
+       for x in (random.random() for _ in range(n))]
+
+  def one():
+    return [Ranges("$x", a, goal) for goal in goals]
+  print(f"  values {n:,}  goals {len(goals)}")
+  for what, f in [("one", one), ("many", lambda: Ranges.many("$x", a, goals))]:
+    t, rs = timed(f)
+    print(f"  {what:6} {t:7.2f} s  ranges {sum(len(r.ranges) for r in rs):4}")
+
+
+@bench
+def bench_bootstrap(n):
+  "`Rx.bootstrap` of pairs of treatments: resamples in a loop vs in bulk."
+  from .rx import Rx
+  m = min(n, 2048)
+  rxs = [Rx(rx=k, all=[random.gauss(mu, 1) for _ in range(m)])
+         for k, mu in enumerate([0, 0, .3, .6])]
+  pairs = [(one, two) for one in rxs for two in rxs if one.rx < two.rx]
+
+  def run(how):
+    old, my.Sboot = my.Sboot, how
+    try:
+      return [one.bootstrap(two) for one, two in pairs]
+    finally:
+      my.Sboot = old
+  t1, want = timed(run, "loop")
+  t2, got = timed(run, "bulk")
+  same = sum(x == y for x, y in zip(want, got))
+  print(f"  values {m:,}  pairs {len(pairs)}  same {same}")
+  print(f"  loop  {t1:8.2f} s")
+  print(f"  bulk  {t2:8.2f} s  ({t1 / t2:.1f} x)")
@@ -0,0 +1,91 @@
+"""
+Bitmap indexes. A set of row ids is kept as the bits of one Python
+int, so intersections (`&`), unions (`|`), differences (`& ~`) and
+counts (`popcount`) are done in C, a machine word at a time, and
+not by looping over rows in Python.
+
+An `Index` over some rows returns the set of rows matched by a range
+of a column (e.g. a `Range` from `Ranges`). Numeric columns are sorted
+once, after which any range is just a run of that sorted column.
+"""
+from .lib import Thing
+from .col import Magic
+from bisect import bisect_left, bisect_right
+
+_bits = [tuple(k for k in range(8) if byte >> k & 1) for byte in range(256)]
+
+
+def bitset(ids, n):
+  "Return the set of `ids` (all less than `n`), as an int."
+  buf = bytearray((n >> 3) + 1)
+  for k in ids:
+    buf[k >> 3] |= 1 << (k & 7)
+  return int.from_bytes(buf, "little")
+
+
+def members(b):
+  "Return the ids in the set `b`, in ascending order."
+  out = []
+  for j, byte in enumerate(b.to_bytes((b.bit_length() >> 3) + 1, "little")):
+    if byte:
+      out += [(j << 3) + k for k in _bits[byte]]
+  return out
+
+
+def popcount(b):
+  "How many ids are in the set `b`?"
+  return bin(b).count("1")
+
+
+class Index(Thing):
+  """
+  Bitmap indexes over some `rows`. `of` returns the set of rows whose
+  value in one column is in some range. Numeric columns are sorted
+  (on first use, or given as `sorts`: sorted `(x, id)` pairs, with no
+  missing values). Symbolic columns are grouped, once, by symbol.
+  Each set made by `of` is kept, so asking again is free.
+  """
+  def __init__(i, rows, sorts=None):
+    i.rows, i.n = rows, len(rows)
+    i._sorts, i._xs, i._syms, i._of = dict(sorts or {}), {}, {}, {}
+
+  def of(i, pos, lo, hi, num=True):
+    "The rows where `lo <= row[pos] <= hi` (and the value is not missing)."
+    if not num:
+      return i.syms(pos).get(lo, 0)
+    key = (pos, lo, hi)
+    if key not in i._of:
+      s = i.sorts(pos)
+      xs = i._xs[pos]
+      i._of[key] = bitset((k for _, k in
+                           s[bisect_left(xs, lo):bisect_right(xs, hi)]), i.n)
+    return i._of[key]
+
+  def where(i, rules):
+    "The rows matched by all of some `(pos, lo, hi, num)` rules."
+    b = (1 << i.n) - 1
+    for rule in rules:
+      b &= i.of(*rule)
+    return b
+
+  def sorts(i, pos):
+    if pos not in i._sorts:
+      xs = ((row[pos], k) for k, row in enumerate(i.rows))
+      i._sorts[pos] = sorted([(x, k) for x, k in xs if not Magic.no(x)],
+                             key=lambda z: z[0])
+    if pos not in i._xs:
+      i._xs[pos] = [x for x, _ in i._sorts[pos]]
+    return i._sorts[pos]
+
+  def syms(i, pos):
+    if pos not in i._syms:
+      ids = {}
+      for k, row in enumerate(i.rows):
+        if not Magic.no(row[pos]):
+          ids.setdefault(row[pos], []).append(k)
+      i._syms[pos] = {x: bitset(lst, i.n) for x, lst in ids.items()}
+    return i._syms[pos]
+
+  def select(i, b):
+    "The rows in the set `b`."
+    return [i.rows[k] for k in members(b)]
@@ -1,9 +1,13 @@
 """
 Tools to generate `Num`ber and `Sym`bolic columns,
 generate summaries of data in columns, and to manage
-sets of columns (`Cols`).
+sets of columns (`Cols`). The roles of the columns in a header
+are worked out once, then kept in a `Schema` that is shared by
+all the `Cols` made from that header.
 """
 from .lib import Thing
+from .my import my
+import heapq
 
 
 class Magic:
@@ -34,9 +38,9 @@ class Magic:
 
 
 class Col(Thing):
-  def __init__(i, pos, txt):
+  def __init__(i, pos, txt, w=None):
     i.n, i.pos, i.txt = 0, pos, txt
-    i.w = -1 if Magic.lessp(txt) else 1
+    i.w = w or (-1 if Magic.lessp(txt) else 1)
 
   def __add__(i, x):
     if Magic.no(x):
@@ -46,9 +50,24 @@ class Col(Thing):
 
 
 class Num(Col):
+  """
+  Summarize numbers: their mean, variance (using Welford's method)
+  and range. Percentiles are only kept by columns that ask for them
+  (see `keep`) or, if `my.q` is not "none", by all columns.
+  """
   def __init__(i, *lst):
     super().__init__(*lst)
-    i.mu, i.lo, i.hi = 0, 10**32, -10**32
+    i.mu, i.m2, i.lo, i.hi, i.some = 0, 0, 10**32, -10**32, None
+    if my.q != "none":
+      i.keep(my.q)
+
+  def keep(i, how="sketch"):
+    """
+    From now on, keep what `quantile` needs: a bounded memory
+    `Sketch` or (if `how` is "all") every value.
+    """
+    i.some = Sketch() if how == "sketch" else []
+    return i
 
   def mid(i):
     return i.mu
@@ -56,9 +75,43 @@ class Num(Col):
   def add(i, x):
     x = float(x)
     i.lo, i.hi = min(i.lo, x), max(i.hi, x)
-    i.mu = i.mu + (x - i.mu) / i.n
+    d = x - i.mu
+    i.mu = i.mu + d / i.n
+    i.m2 += d * (x - i.mu)
+    if i.some is not None:
+      i.some.append(x)
     return x
 
+  def var(i):
+    return i.m2 / (i.n - 1) if i.n > 1 else 0
+
+  def sd(i):
+    return i.var()**0.5
+
+  def quantile(i, p):
+    "Return the value `p` (0..1) of the way through the numbers."
+    assert i.some is not None, f"no percentiles kept for {i.txt}"
+    if isinstance(i.some, Sketch):
+      return i.some.quantile(p)
+    i.some.sort()
+    return i.some[min(len(i.some) - 1, int(p * len(i.some)))]
+
+  def perc(i, ps=[.25, .5, .75]):
+    return [i.quantile(p) for p in ps]
+
+  def merge(i, j):
+    "Fold the summary of another `Num` into this one."
+    n = i.n + j.n
+    if j.n:
+      d = j.mu - i.mu
+      i.m2 += j.m2 + d * d * i.n * j.n / n
+      i.mu = i.mu + d * j.n / n
+      i.lo, i.hi = min(i.lo, j.lo), max(i.hi, j.hi)
+      if i.some is not None and j.some is not None:
+        i.some += j.some
+    i.n = n
+    return i
+
   def norm(i, x):
     if Magic.no(x):
       return x
@@ -74,39 +127,228 @@ class Num(Col):
     return abs(i.norm(x) - i.norm(y))
 
 
+class Sketch(Thing):
+  """
+  A bounded memory summary of a stream of numbers that can report
+  (approximate) percentiles; i.e. a small merging t-digest. New
+  values are buffered, then folded into a sorted list of centroids
+  `[mean, n]`. Centroids near the tails stay small (so extreme
+  percentiles are accurate) and there are only O(k) of them.
+  """
+  def __init__(i, k=None):
+    i.k, i.n, i.lo, i.hi = k or my.Q, 0, 10**32, -10**32
+    i.all, i.new = [], []
+
+  def append(i, x):
+    i.new.append(x)
+    if len(i.new) >= 4 * i.k:
+      i.fold()
+
+  def __iadd__(i, j):
+    "Fold another sketch into this one."
+    j.fold()
+    i.fold(j.all)
+    return i
+
+  def fold(i, more=[]):
+    "Add buffered values (and any `more` centroids) into the centroids."
+    if not i.new and not more:
+      return
+    pts = sorted(i.all + more + [[x, 1] for x in i.new])
+    i.new = []
+    i.n = n = sum(w for _, w in pts)
+    i.lo, i.hi = min(i.lo, pts[0][0]), max(i.hi, pts[-1][0])
+    out, before = [pts[0][:]], 0
+    for x, w in pts[1:]:
+      last = out[-1]
+      q = (before + last[1] + w / 2) / n
+      if last[1] + w <= 4 * n * q * (1 - q) / i.k:
+        last[1] += w
+        last[0] += (x - last[0]) * w / last[1]
+      else:
+        before += last[1]
+        out += [[x, w]]
+    i.all = out
+
+  def quantile(i, p):
+    "Interpolate between the centers of the centroids around `p`."
+    i.fold()
+    if not i.all:
+      return None
+    at, before = [(0, i.lo)], 0
+    for x, w in i.all:
+      at += [(before + w / 2, x)]
+      before += w
+    at += [(i.n, i.hi)]
+    want = p * i.n
+    for (n1, x1), (n2, x2) in zip(at, at[1:]):
+      if n1 <= want <= n2:
+        return x1 if n2 == n1 else x1 + (x2 - x1) * (want - n1) / (n2 - n1)
+    return i.hi
+
+
 class Sym(Col):
+  """
+  Summarize symbols: how often we have `seen` each one, and the
+  most common (the `mode`). If `my.K` > 0, then only keep counts
+  for `K` symbols (using the Space-Saving heavy hitters method):
+  a new symbol replaces the least counted one, and inherits its
+  count. Counts then over-estimate by at most `i.over[x]`, and
+  frequent symbols (and the `mode`) are still found. The least
+  counted symbol is found with a heap of `[count, tick, symbol]`
+  whose counts may be stale (too low): they are only updated when
+  they reach the top of the heap (see `evict`).
+  """
   def __init__(i, *lst):
     super().__init__(*lst)
     i.seen, i.most, i.mode = {}, 0, None
+    i.k, i.over, i._heap, i._tick = my.K, {}, [], 0
 
   def mid(i):
     return i.mode
 
   def add(i, x):
-    tmp = i.seen[x] = i.seen.get(x, 0) + 1
+    if i.k and x not in i.seen:
+      if len(i.seen) >= i.k:
+        i.over[x] = i.evict()
+      tmp = i.seen[x] = i.over.get(x, 0) + 1
+      i.push(x)
+    else:
+      tmp = i.seen[x] = i.seen.get(x, 0) + 1
     if tmp > i.most:
       i.most, i.mode = tmp, x
     return x
 
+  def push(i, x):
+    i._tick += 1
+    heapq.heappush(i._heap, [i.seen[x], i._tick, x])
+
+  def least(i):
+    "Return the least count (bringing stale counts up to date)."
+    while True:
+      m, _, x = top = i._heap[0]
+      if i.seen[x] == m:
+        return m
+      i._tick += 1
+      top[0], top[1] = i.seen[x], i._tick
+      heapq.heapreplace(i._heap, top)
+
+  def weakest(i):
+    "The symbol that `evict` would forget next."
+    i.least()
+    return i._heap[0][2]
+
+  def evict(i):
+    "Forget the least counted symbol. Return its count."
+    i.least()
+    x = heapq.heappop(i._heap)[2]
+    i.over.pop(x, None)
+    return i.seen.pop(x)
+
+  def merge(i, j):
+    """
+    Fold the summary of another `Sym` into this one. With bounded
+    counts, a symbol missing from a full summary may have been seen
+    up to that summary's least count times, so (as Space-Saving
+    requires) that much is added to its count and to its `over`.
+    """
+    i.n += j.n
+    lo1 = i.least() if i.k and len(i.seen) >= i.k else 0
+    lo2 = j.least() if j.k and len(j.seen) >= j.k else 0
+    for x in list(i.seen) + [x for x in j.seen if x not in i.seen]:
+      over = (i.over.get(x, 0) if x in i.seen else lo1) + \
+          (j.over.get(x, 0) if x in j.seen else lo2)
+      if over:
+        i.over[x] = over
+      i.seen[x] = i.seen.get(x, lo1) + j.seen.get(x, lo2)
+    return i.bound()
+
+  def bound(i):
+    "After a `merge`, keep the `k` most counted symbols, and a new heap."
+    if i.k:
+      i._heap = []
+      for x in sorted(i.seen, key=i.seen.get)[:-i.k]:
+        i.over.pop(x, None)
+        i.seen.pop(x)
+      [i.push(x) for x in i.seen]
+    i.most, i.mode = 0, None
+    for x, m in i.seen.items():
+      if m > i.most:
+        i.most, i.mode = m, x
+    return i
+
+  def tie(i, last):
+    """
+    When reading rows in one pass, the `mode` is the most common
+    symbol that reached its final count first (i.e. the one whose
+    last appearance is earliest). After merging, use `last` (where
+    each symbol was last seen) to settle ties that way.
+    """
+    tied = {x for x, m in i.seen.items() if m == i.most}
+    if len(tied) > 1:
+      i.mode = min(tied, key=last.get)
+
   def dist(i, x, y):
     return 1 if Magic.no(x) and Magic.no(y) else x != y
 
 
+class Schema(Thing):
+  """
+  What a header says about its columns: their names, which are
+  numeric, which are goals (and the klass), and their weights.
+  Built once per data set. Roles come from the `Magic` markers in the
+  names, unless given as `roles` (one dictionary per column, with the
+  keys `num`, `goal`, `klass` and `less`; see `Schema.roles`).
+  """
+  def __init__(i, lst, roles=None):
+    i.names = lst
+    i.role = roles = roles or Schema.roles(lst)
+    i.nump = [r["num"] for r in roles]
+    i.w = [-1 if r["less"] else 1 for r in roles]
+    i.y = [pos for pos, r in enumerate(roles) if r["goal"]]
+    i.x = [pos for pos, r in enumerate(roles) if not r["goal"]]
+    i.nums = [pos for pos, num in enumerate(i.nump) if num]
+    i.syms = [pos for pos, num in enumerate(i.nump) if not num]
+    i.klas = None
+    for pos, r in enumerate(roles):
+      if r["klass"]:
+        i.klas = pos
+
+  def roles(lst):
+    "The role of each column, from the `Magic` markers in its name."
+    return [dict(num=Magic.nump(s), goal=Magic.goalp(s),
+                 klass=Magic.klassp(s), less=Magic.lessp(s)) for s in lst]
+
+
 class Cols(Thing):
-  def __init__(i):
+  def __init__(i, schema=None):
     i.x, i.y, i.nums, i.syms, i.all, i.klas = {}, {}, {}, {}, [], None
+    i.schema = None
+    if schema:
+      i.use(schema)
 
   def add(i, lst):
     [col.add(lst[col.pos]) for col in i.all]
 
+  def merge(i, j):
+    "Fold the summaries of another `Cols` (with the same header) into these."
+    [one.merge(two) for one, two in zip(i.all, j.all)]
+    return i
+
   def klass(i, lst):
     return lst[i.klas]
 
   def header(i, lst):
-    for pos, txt in enumerate(lst):
-      tmp = (Num if Magic.nump(txt) else Sym)(pos, txt)
-      i.all += [tmp]
-      (i.y if Magic.goalp(txt) else i.x)[pos] = tmp
-      (i.nums if Magic.nump(txt) else i.syms)[pos] = tmp
-      if Magic.klassp(txt):
-        i.klas = tmp
+    i.use(Schema(lst))
+
+  def use(i, schema):
+    "Make fresh (empty) summaries for the columns in `schema`."
+    i.schema = schema
+    i.all = [(Num if num else Sym)(pos, txt, w) for pos, (txt, num, w)
+             in enumerate(zip(schema.names, schema.nump, schema.w))]
+    i.x = {pos: i.all[pos] for pos in schema.x}
+    i.y = {pos: i.all[pos] for pos in schema.y}
+    i.nums = {pos: i.all[pos] for pos in schema.nums}
+    i.syms = {pos: i.all[pos] for pos in schema.syms}
+    if schema.klas is not None:
+      i.klas = i.all[schema.klas]
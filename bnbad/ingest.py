@@ -0,0 +1,171 @@
+"""
+Fast bulk reading of csv data. Rather than cleaning and splitting
+one line at a time (see `rows` and `cols` in `lib`), read big blocks
+of text, kill whitespace and comments in one pass over each block, work
+out the type of each column once (from the `Magic` header markers),
+then return batches of typed rows.
+
+Big files can also be cut into byte ranges (on line boundaries), each
+of which is summarized in its own process (see `pieces`).
+"""
+from .lib import cols, rows
+from .col import Cols, Magic
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import os
+import re
+import sys
+
+comments = re.compile(r'#[^\n]*')
+
+
+def clean(txt):
+  "Kill whitespace and comments, in bulk."
+  if "#" in txt:
+    txt = comments.sub("", txt)
+  return txt.replace(" ", "").replace("\t", "").replace("\r", "")
+
+
+def blocks(x=None, size=2**20):
+  """
+  Yield big chunks of text from stdio or a file or a string.
+  Chunks end on a line boundary.
+  """
+  if x and x[-3:] != 'csv':
+    yield x
+    return
+  fp = open(x) if x else sys.stdin
+  try:
+    carry = ""
+    while True:
+      txt = fp.read(size)
+      if not txt:
+        break
+      txt = carry + txt
+      cut = txt.rfind("\n") + 1
+      carry = txt[cut:]
+      if cut:
+        yield txt[:cut]
+    if carry:
+      yield carry
+  finally:
+    if x:
+      fp.close()
+
+
+def num(s):
+  "Coerce a numeric cell (unless it is missing)."
+  return s if Magic.no(s) else float(s)
+
+
+def converter(head, todo, f):
+  """
+  Return a function that takes one split line and returns the cells
+  at positions `todo`, with numerics coerced by `f`. Compiled once
+  per file (so there is no per-cell loop over types).
+  """
+  cells = [f"f(a[{n}])" if Magic.nump(head[n]) else f"a[{n}]"
+           for n in todo]
+  return eval("lambda a: [" + ", ".join(cells) + "]", dict(f=f))
+
+
+def batches(x=None, size=2**20):
+  """
+  Read csv rows from stdio or a file or a string or a list,
+  `size` characters at a time. Kill any whitespace or comments.
+  Ignore columns if, on line one, the name contains '?'.
+  Yield lists of rows where the first row of the first list
+  is the header, and numeric cells (see `Magic.nump`) are floats.
+  """
+  if isinstance(x, (list, tuple)):
+    yield list(cols(rows(x)))
+    return
+  fast = safe = None
+  for txt in blocks(x, size):
+    lines = [s for s in clean(txt).split("\n") if s]
+    out = []
+    if fast is None and lines:
+      head = lines.pop(0).split(",")
+      out, fast, safe = header(head)
+      out = [out]
+    out += typed(lines, fast, safe)
+    if out:
+      yield out
+
+
+def header(head):
+  """
+  Return the names of the columns we keep (those without '?'),
+  then fast and safe (missing values allowed) row converters.
+  """
+  todo = [n for n, s in enumerate(head) if "?" not in s]
+  return ([head[n] for n in todo],
+          converter(head, todo, float), converter(head, todo, num))
+
+
+def typed(lines, fast, safe):
+  "Split and convert some cleaned (non-empty) lines."
+  return [(safe if "?" in s else fast)(s.split(",")) for s in lines]
+
+
+def spans(x, jobs):
+  """
+  Return the header of csv file `x`, and `jobs` byte ranges
+  (that start and end on line boundaries) that cover the rest of `x`.
+  """
+  with open(x, "rb") as fp:
+    head = ""
+    while not head:
+      line = fp.readline()
+      if not line:
+        break
+      head = clean(line.decode()).strip()
+    start, end = fp.tell(), os.path.getsize(x)
+    cuts = [start]
+    for k in range(1, jobs):
+      fp.seek(max(cuts[-1], start + (end - start) * k // jobs))
+      fp.readline()
+      cuts += [min(fp.tell(), end)]
+    cuts += [end]
+  return head.split(","), cuts[:-1], cuts[1:]
+
+
+def part(x, lo, hi, head):
+  "Return the typed rows in bytes `lo` to `hi` of csv file `x`."
+  with open(x, "rb") as fp:
+    fp.seek(lo)
+    txt = fp.read(hi - lo).decode()
+  _, fast, safe = header(head)
+  return typed([s for s in clean(txt).split("\n") if s], fast, safe)
+
+
+def piece(x, lo, hi, head):
+  """
+  Worker for `pieces`. Summarize bytes `lo` to `hi` of csv file `x`.
+  Return a `Cols` of those rows and, for each `Sym` column, where
+  (in those rows) each symbol was last seen (see `Sym.tie`).
+  """
+  c = Cols()
+  c.header(header(head)[0])
+  last = {pos: {} for pos in c.syms}
+  for k, row in enumerate(part(x, lo, hi, head)):
+    [col + row[col.pos] for col in c.all]
+    for pos, seen in last.items():
+      seen[row[pos]] = k
+  return c, last
+
+
+def pieces(x, jobs):
+  """
+  Read csv file `x`, summarizing it in `jobs` processes (while, in
+  this one, its rows are parsed). Yield the header then, in file
+  order, the rows of each byte range, and their summaries (see
+  `piece`). Only the summaries are sent back by the workers.
+  """
+  head, los, his = spans(x, jobs)
+  yield header(head)[0]
+  with ProcessPoolExecutor(jobs) as pool:
+    todo = list(map(pool.submit, repeat(piece), repeat(x), los, his,
+                    repeat(head)))
+    for lo, hi, job in zip(los, his, todo):
+      yield (part(x, lo, hi, head), *job.result())
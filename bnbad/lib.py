@@ -1,6 +1,7 @@
 """
 Misc Python functions
 """
+from collections import OrderedDict
 import random
 import pprint
 import sys
@@ -98,6 +99,33 @@ class o(Thing):
   def __init__(i, **d): i.__dict__.update(**d)
 
 
+class Cache(Thing):
+  """
+  Remember up to `size` key,value pairs. When full, forget the
+  least recently used pair. Counts `hits` and `misses`.
+  """
+  def __init__(i, size=2**16):
+    i.size, i.hits, i.misses, i._kept = size, 0, 0, OrderedDict()
+
+  def get(i, key):
+    "Return the value of `key` (or None, if we do not have it)."
+    v = i._kept.get(key)
+    if v is None:
+      i.misses += 1
+    else:
+      i.hits += 1
+      i._kept.move_to_end(key)
+    return v
+
+  def put(i, key, v):
+    "Keep `key`, `v`, then return `v`."
+    i._kept[key] = v
+    i._kept.move_to_end(key)
+    if len(i._kept) > i.size:
+      i._kept.popitem(last=False)
+    return v
+
+
 def rows(x=None):
   """
   Read csv rows from stdio or a file or a string or a list.
@@ -145,9 +173,13 @@ def pairs(lst):
     last = i
 
 
-def shuffle(lst):
-  "Return a shuffled list."
-  random.shuffle(lst)
+def shuffle(lst, rng=random):
+  """
+  Return a shuffled list (shuffled in place, if `lst` is a list),
+  using the random numbers of `rng` (default: the `random` module).
+  """
+  lst = lst if isinstance(lst, list) else list(lst)
+  rng.shuffle(lst)
   return lst
 
 
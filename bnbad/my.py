@@ -14,6 +14,9 @@ def help():
       h("bin min size =len**b",                            b=.5),
       h("what columns to while tree building",      c=["x", "y"]),
       h("use at most 'd' rows for distance calcs",         d=256),
+      h("cache at most C distances (0 means no cache)",      C=0),
+      h("index the 'd' rows (in a vp-tree) for distance calcs", I=False),
+      h("index: find far rows using Ib*sqrt(n) distances",  Ib=4),
       h("merge ranges whose scores differ by less that F", e=0.05),
       h("separation of poles (f=1 means 'max distance')",  f=.9),
       h("decision list: minimum leaf size",                M=10),
@@ -22,16 +25,34 @@ def help():
       h("coefficient for distance",                        p=2),
       h("random number seed",                              r=1),
       h("tree leaves must be at least n**s in size",       s=0.5),
+      h("tree: with jobs, grow subtrees at depth z in parallel", z=3),
+      h("tree: on insert, split leaves with more than W*2*n**s rows",
+        W=2.0),
+      h("tree: rank by non-dominated sorting if more leaves than this",
+        nds=2000),
+      h("ranges: keep bins in 'arrays' (fast) or as 'objects'",
+        R=["arrays", "objects"]),
+      h("ranges: merge bins in 'passes' or, from a 'heap', best first",
+        Rm=["passes", "heap"]),
+      h("ranges: most bins kept when streaming",           Rk=128),
+      h("num: keep percentiles: 'none', in a 'sketch', or 'all' values",
+        q=["none", "sketch", "all"]),
+      h("num: sketch size (more means more accurate)",      Q=100),
+      h("sym: most symbols to count (0 means all)",         K=0),
       h("stats: Cliff's Delta 'dull'",    Sdull=[.147, .33, .474]),
       h("stats: Coehn 'd'",                           Scohen=0.2),
       h("stats: number of boostrap samples",               Sb=500),
       h("stats: bootstrap confidences",                    Sconf=0.01),
+      h("stats: bootstrap resamples drawn in 'bulk' or in a 'loop'",
+        Sboot=["bulk", "loop"]),
       h("training data (arff format",           train="train.csv"),
       h("testing data (csv format)",               test="test.csv"),
       h("List all tests",                                  L=False),
       h("Run all tests",                                   T=False),
       h("Verbose mode",                                    V=False),
-      h("Run just the tests with names matching 'S'",      t="")
+      h("Run just the tests with names matching 'S'",      t=""),
+      h("Run the benchmarks with names matching 'B'",     B=""),
+      h("benchmarks: number of rows",                 Bn=10**6)
   ]
 
 
@@ -3,10 +3,12 @@ Divide data into ranges, then merge
 similar values.
 """
 
-from .col import Magic
+from .col import Magic, Sym
 from .my import my
 from .lib import *
 from .lib import Thing
+from bisect import bisect_right
+import heapq
 
 
 class Ranges(Thing):
@@ -14,25 +16,37 @@ class Ranges(Thing):
   Report how to divide a list of pairs `[x,y]`
   such that groups of `x` values most select for some
   desired `y` (which is called the `goal`.
+  If `presorted`, then numeric pairs are already sorted on `x`
+  (and have no missing `x` values).
   """
-  def __init__(i, txt, a, goal=True, get=lambda z: z[0]):
+  def __init__(i, txt, a, goal=True, get=lambda z: z[0], presorted=False):
     i.txt = txt
     i.goal = goal
     i.get = get
+    i.presorted = presorted
     i.bin = lambda: Range(txt, i)
     i.all = i.bin()
     i.ranges = (i.nums if Magic.nump(txt) else i.syms)(a)
 
   def syms(i, a):
-    "When discretizing symbols, Generate one range for each symbol."
-    d = {}
+    """
+    When discretizing symbols, Generate one range for each symbol.
+    If `my.K` > 0, only do so for the `K` most frequent symbols.
+    """
+    d, keep = {}, None
+    if my.K:
+      s = Sym(0, i.txt)
+      [s + x1 for x1, _ in a]
+      keep = s.seen
     for x1, y1 in a:
       if Magic.no(x1):
         continue
+      i.all.add(x1, y1)
+      if keep is not None and x1 not in keep:
+        continue
       if x1 not in d:
         d[x1] = i.bin()
       d[x1].add(x1, y1)
-      i.all.add(x1, y1)
     return d.values()
 
   def nums(i, a):
@@ -40,11 +54,159 @@ class Ranges(Thing):
     When discretizing numbers,
     Generate lots of small ranges, then
     merge those with similar scores."
+    If `my.R` is "arrays", do that without making a `Range`
+    per bin (see `bins`).
     """
+    if my.R == "arrays":
+      return i.bins(i.pairs(a))
     return i.merge(i.grow(i.pairs(a)))
 
+  def bins(i, a):
+    """
+    When discretizing numbers, do what `grow` then `merge` do, but
+    keep the bins in parallel lists (`n`, `yes`, `no`, `lo`, `hi`,
+    `gen`), merged in place. Only the final bins become `Range`s.
+    Since `a` is sorted, each small bin is a slice of `a`, so its
+    counts come from slices (and its `lo`,`hi` from its ends).
+    Counts are `_ones(...)[k]`: 0.0001 plus `k` ones, added one at a time
+    (as `Range.add` does), so scores match those of `grow`, `merge`.
+    Bins are merged in `passes` (like `merge`) or, if `my.Rm` is
+    "heap", greedily, best merge first (see `heap`).
+    """
+    return i.count(a, [y == i.goal for _, y in a], *_cuts(len(a)))
+
+  def count(i, a, ys, starts, ends):
+    """
+    Bin sorted pairs `a` into the slices `starts[k]:ends[k]`, where
+    `ys` says which pairs are the goal. Then merge, as `bins` does.
+    """
+    m = len(a)
+    yes = [sum(ys[j:k]) for j, k in zip(starts, ends)]
+    n = [k - j for j, k in zip(starts, ends)]
+    ones = _ones(yes + [k - y for k, y in zip(n, yes)] +
+                 [sum(yes), m - sum(yes)])
+    i.all.n, i.all.yes, i.all.no = m, ones[sum(yes)], ones[m - sum(yes)]
+    if m:
+      i.all.lo, i.all.hi = a[0][0], a[-1][0]
+    no = [ones[k - y] for k, y in zip(n, yes)]
+    yes = [ones[y] for y in yes]
+    lo = [a[j][0] if j < m else None for j in starts]
+    hi = [a[k - 1][0] if j < m else None for j, k in zip(starts, ends)]
+    gen = [1] * len(n)
+    return i.emit(n, yes, no, lo, hi, gen)
+
+  def many(txt, a, goals, get=lambda z: z[0], presorted=False):
+    """
+    Return one `Ranges` per goal in `goals`, sorting `a` only once.
+    Here, each `y` in the pairs `[x,y]` is either one label per goal,
+    or one label (compared to every goal). If `my.R` is "arrays",
+    the small bins are cut once and only their counts differ per goal.
+    """
+    num = Magic.nump(txt)
+    if num and not presorted:
+      a = sorted([(x, y) for x, y in a if not Magic.no(x)],
+                 key=lambda z: z[0])
+
+    def label(k, y):
+      return y[k] if isinstance(y, (list, tuple)) else y
+    if not num or my.R != "arrays":
+      return [Ranges(txt, [(x, label(k, y)) for x, y in a], goal, get,
+                     presorted=num) for k, goal in enumerate(goals)]
+    cuts, out = _cuts(len(a)), []
+    for k, goal in enumerate(goals):
+      r = Ranges(txt, [], goal, get, presorted=True)
+      r.ranges = r.count(a, [label(k, y) == goal for _, y in a], *cuts)
+      out += [r]
+    return out
+
+  def emit(i, n, yes, no, lo, hi, gen=None):
+    "Merge some bins (kept in lists), then return them as `Range`s."
+    gen = gen or [1] * len(n)
+    (i.heap if my.Rm == "heap" else i.passes)(n, yes, no, lo, hi, gen)
+    out = []
+    for k in range(len(n)):
+      r = i.bin()
+      r.n, r.yes, r.no, r.lo, r.hi, r.gen = \
+          n[k], yes[k], no[k], lo[k], hi[k], gen[k]
+      out += [r]
+    return out
+
+  def scorer(i):
+    "Return a function that does `Range.s` on a bin's `yes`,`no` counts."
+    ally, alln, e = i.all.yes, i.all.no, my.e
+
+    def s(y, n):
+      y, n = y / ally, n / alln
+      tmp = y**2 / (y + n + 0.0001)
+      return tmp if tmp > e else 0
+    return s
+
+  def passes(i, n, yes, no, lo, hi, gen):
+    """
+    Merge bins (kept in lists, see `bins`) as `merge` does: pass left
+    to right, merging adjacent pairs; repeat till nothing merges.
+    """
+    s, e = i.scorer(), my.e
+    size = len(n) + 1
+    while len(n) < size:
+      size, j, w = len(n), 0, 0
+      while j < size:
+        n[w], yes[w], no[w] = n[j], yes[j], no[j]
+        lo[w], hi[w], gen[w] = lo[j], hi[j], gen[j]
+        if j < size - 1:
+          k = j + 1
+          y2, n2 = yes[j] + yes[k], no[j] + no[k]
+          sa, sb, sc = s(yes[j], no[j]), s(yes[k], no[k]), s(y2, n2)
+          if abs(sb - sa) < e or sc >= sb and sc >= sa:
+            n[w], yes[w], no[w] = n[j] + n[k], y2, n2
+            hi[w], gen[w] = hi[k], max(gen[j], gen[k]) + 1
+            j += 1
+        w, j = w + 1, j + 1
+      del n[w:], yes[w:], no[w:], lo[w:], hi[w:], gen[w:]
+
+  def heap(i, n, yes, no, lo, hi, gen):
+    """
+    Merge bins (kept in lists, see `bins`) greedily. Keep all the
+    adjacent pairs that could merge (see `Range.better`) in a heap,
+    keyed on how much merging them improves on the better of the two.
+    Pop the best, merge it, then push the (at most two) new pairs made
+    with its neighbors. Pairs whose bins have since changed are
+    skipped. Costs O(b log b) for `b` bins.
+    """
+    s, e, m = i.scorer(), my.e, len(n)
+    after, before = list(range(1, m + 1)), list(range(-1, m - 1))
+    ver, heap = [0] * m, []
+
+    def push(j):
+      k = after[j]
+      if j >= 0 and k < m:
+        sa, sb = s(yes[j], no[j]), s(yes[k], no[k])
+        sc = s(yes[j] + yes[k], no[j] + no[k])
+        if abs(sb - sa) < e or sc >= sb and sc >= sa:
+          heapq.heappush(heap, (max(sa, sb) - sc, j, ver[j], ver[k]))
+    for j in range(m - 1):
+      push(j)
+    while heap:
+      _, j, vj, vk = heapq.heappop(heap)
+      k = after[j]
+      if ver[j] != vj or k >= m or ver[k] != vk:
+        continue
+      n[j], yes[j], no[j] = n[j] + n[k], yes[j] + yes[k], no[j] + no[k]
+      hi[j], gen[j] = hi[k], max(gen[j], gen[k]) + 1
+      ver[j], ver[k] = ver[j] + 1, -1
+      after[j] = after[k]
+      if after[k] < m:
+        before[after[k]] = j
+      push(before[j])
+      push(j)
+    keep = [j for j in range(m) if ver[j] >= 0]
+    for lst in [n, yes, no, lo, hi, gen]:
+      lst[:] = [lst[j] for j in keep]
+
   def pairs(i, a):
     "When discretizing numbers, convert `a` into a list of x,y pairs"
+    if i.presorted:
+      return a
     lst = [(x, y) for x, y in a if not Magic.no(x)]
     return sorted(lst, key=lambda z: z[0])
 
@@ -83,6 +245,82 @@ class Ranges(Thing):
     return i.merge(tmp) if len(tmp) < len(bins) else bins
 
 
+class Stream(Ranges):
+  """
+  Discretize an endless stream of `[x,y]` pairs, in bounded memory.
+  Each new `x` is added to the bin whose `lo..hi` holds it, else it
+  starts a new bin. Whenever there are more than `k` bins, the two
+  adjacent bins with the fewest values are merged (so bins stay of
+  similar size, where the data is densest). At any time, `ranges`
+  merges a copy of those bins (as `Ranges` does) and returns them as
+  `Range`s, scored against the same `all` counts. For symbols, there
+  is one bin per symbol, for just the `k` most frequent symbols (found
+  by a Space-Saving `Sym`, as `syms` does with `my.K`).
+  """
+  def __init__(i, txt, goal=True, get=lambda z: z[0], k=None):
+    i.txt, i.goal, i.get, i.k = txt, goal, get, k or my.Rk
+    i.bin = lambda: Range(txt, i)
+    i.all, i.bins, i.los, i.seen = i.bin(), [], [], {}
+    i.num = Magic.nump(txt)
+    i.sym = Sym(0, txt)
+    i.sym.k = i.k
+
+  def add(i, x, y):
+    if Magic.no(x):
+      return
+    i.all.add(x, y)
+    if not i.num:
+      if x not in i.sym.seen and len(i.sym.seen) >= i.k:
+        i.seen.pop(i.sym.weakest(), None)
+      i.sym + x
+      if x not in i.seen:
+        i.seen[x] = i.bin()
+      i.seen[x].add(x, y)
+      return
+    j = bisect_right(i.los, x) - 1
+    if j < 0 or x > i.bins[j].hi:
+      j += 1
+      i.bins.insert(j, i.bin())
+      i.los.insert(j, x)
+    i.bins[j].add(x, y)
+    if len(i.bins) > i.k:
+      i.shrink()
+
+  def shrink(i):
+    "Merge the two adjacent bins with the fewest values."
+    b = i.bins
+    j = min(range(len(b) - 1), key=lambda j: b[j].n + b[j + 1].n)
+    b[j:j + 2] = [b[j].merge(b[j + 1])]
+    b[j].gen = 1
+    i.los[j:j + 2] = [b[j].lo]
+
+  @property
+  def ranges(i):
+    if not i.num:
+      return list(i.seen.values())
+    b = i.bins
+    return i.emit([r.n for r in b], [r.yes for r in b], [r.no for r in b],
+                  [r.lo for r in b], [r.hi for r in b])
+
+
+def _cuts(m):
+  "Where `bins` starts and ends its small bins, for `m` sorted values."
+  small = int(m**my.b) + 1
+  use = m - m**my.b
+  starts = [0] + [j for j in range(small, m, small) if j < use]
+  return starts, starts[1:] + [m]
+
+
+def _ones(ks):
+  "Map each count `k` in `ks` to 0.0001, plus `k` ones (added one at a time)."
+  out, x, j = {}, 0.0001, 0
+  for k in sorted(set(ks)):
+    for _ in range(k - j):
+      x += 1
+    out[k], j = x, k
+  return out
+
+
 class Range(Thing):
   def __init__(i, what, ranges):
     i.what, i._ranges = what,  ranges
@@ -4,6 +4,8 @@ between sets of values.
 """
 from .lib import xtile, Thing, perc
 from .my import my
+from array import array
+from operator import mul
 import random
 
 
@@ -85,7 +87,8 @@ class Rx(Thing):
   each treatment has 1000s of values, it would be reasonable to skip
   it. Without bootstrapping,  256 treatments with 1000 values
   can be sorted in less than 2 seconds. But with that skipping
-  that same process takes half an hour.
+  that same process takes half an hour (several times less if
+  `my.Sboot` is "bulk"; see `bulk`).
   """
   def __init__(i, rx="", all=[], lo=0, hi=1,
                width=50,
@@ -164,7 +167,7 @@ class Rx(Thing):
     d = (more - less) / (m*n)
     return abs(d) <= dull
 
-  def bootstrap(i, j, onf=my.Sconf, b=my.Sb):
+  def bootstrap(i, j, conf=my.Sconf, b=my.Sb):
     """
     Two  lists y0,z0 are the same if the same patterns can be seen in
     all of them, as well as in 100s to 1000s  sub-samples from each.
@@ -172,7 +175,11 @@ class Rx(Thing):
 
     This function checks for  different properties between (a) the two
     lists and (b) hundreds of sample-with-replacements sets.
+    If `my.Sboot` is "bulk", then that is done by `bulk`.
     """
+    if my.Sboot == "bulk":
+      return i.bulk(j, conf, b)
+
     class Sum():
       "# Quick & dirty class to summarize sets of values."
       def __init__(i, some=[]):
@@ -219,3 +226,59 @@ class Rx(Thing):
                        Sum([one(zhat) for _ in zhat])) > baseline:
         bigger += 1
     return bigger / b >= conf
+
+  def bulk(i, j, conf=my.Sconf, b=my.Sb):
+    """
+    Does what `bootstrap` does, but all `b` resamples of a list are
+    drawn at once (see `resample`), then cut into rows, each of which
+    is summarized with built-in `sum`s (of values, and of squares).
+    Values are centered on their own mean (which does not change the
+    test statistic) so those sums stay small.
+    """
+    def stats(lst):
+      n = len(lst)
+      mu = sum(lst) / n
+      return n, mu, sum((x - mu)**2 for x in lst) / (n - 1)
+
+    def samples(lst):
+      n, mu, _ = stats(lst)
+      some = resample([x - mu for x in lst], n * b)
+      for k in range(0, n * b, n):
+        one = some[k:k + n]
+        mu = sum(one) / n
+        yield n, mu, (sum(map(mul, one, one)) - n * mu * mu) / (n - 1)
+
+    def testStatistic(y, z):
+      (n1, mu1, s1), (n2, mu2, s2) = y, z
+      delta = mu2 - mu1
+      if s1 + s2:
+        delta = delta / ((s1 / n1 + s2 / n2)**0.5)
+      return delta
+    # --------------
+    baseline = testStatistic(stats(i.all), stats(j.all))
+    bigger = sum(testStatistic(y, z) > baseline
+                 for y, z in zip(samples(i.all), samples(j.all)))
+    return bigger / b >= conf
+
+
+def resample(lst, k):
+  """
+  Return `k` numbers picked at random, with replacement, from `lst`.
+  Indices are drawn in bulk, as 16 bit ints, from `random.getrandbits`,
+  then mapped to numbers via a lookup table. Indices past the last
+  whole multiple of `len(lst)` map to `None`, and are redrawn (so all
+  numbers are equally likely). Small jobs (or long lists) just use
+  `random.choices`.
+  """
+  n, most = len(lst), 2**16
+  if n > most // 16 or k < most:
+    return random.choices(lst, k=k)
+  m = n * (most // n)
+  table = [lst[x % n] for x in range(m)] + [None] * (most - m)
+  bits = random.getrandbits(16 * k).to_bytes(2 * k, "little")
+  out = list(map(table.__getitem__, array("H", bits)))
+  j = 0
+  for _ in range(out.count(None) if m < most else 0):
+    j = out.index(None, j)
+    out[j] = random.choice(lst)
+  return out
@@ -0,0 +1,244 @@
+"""
+Columnar storage for `Tab`les. Instead of one Python list per row,
+keep one typed `array` per column (floats for `Num`s, integer codes
+for `Sym`s) plus a validity mask that marks the missing (`?`) cells.
+Rows are then read back, on demand, as light-weight `Row` proxies.
+Sub-sets of rows (from lists or stores) can be `Picked` out by an
+index, without copying them.
+
+Stores can be saved to, and loaded from, a binary file:
+
+    BNBAD001 | meta size | meta (json) | column buffers | masks
+
+where `meta` holds the header, the column summaries and the offsets
+of each buffer. Loading can memory-map the file, in which case
+buffers are paged in only when first read.
+"""
+from .lib import Thing
+from .col import Num
+from array import array
+import json
+import mmap
+import struct
+import sys
+
+
+class Store(Thing):
+  """
+  The cells of a table, held column by column.
+  `Num` columns are `array('d')`; `Sym` columns are `array('i')`
+  codes that index into `i.words[pos]`. If `i.ok[pos][r]` is 0,
+  then cell `r` of column `pos` is missing.
+  """
+  def __init__(i, cols):
+    i.n, i.mapped, i._mm, i._view = 0, False, None, None
+    i.nump = [isinstance(c, Num) for c in cols.all]
+    i.data = [array('d' if num else 'i') for num in i.nump]
+    i.ok = [bytearray() for _ in i.nump]
+    i.codes = [{} for _ in i.nump]
+    i.words = [[] for _ in i.nump]
+
+  def add(i, row):
+    if i.mapped:
+      i.own()
+    for pos, x in enumerate(row):
+      if x == "?":
+        i.ok[pos].append(0)
+        i.data[pos].append(0)
+        continue
+      i.ok[pos].append(1)
+      if i.nump[pos]:
+        i.data[pos].append(x)
+      else:
+        code = i.codes[pos].get(x)
+        if code is None:
+          code = i.codes[pos][x] = len(i.words[pos])
+          i.words[pos].append(x)
+        i.data[pos].append(code)
+    i.n += 1
+
+  def cell(i, r, pos):
+    if not i.ok[pos][r]:
+      return "?"
+    x = i.data[pos][r]
+    return x if i.nump[pos] else i.words[pos][x]
+
+  def row(i, r):
+    return [i.cell(r, pos) for pos in range(len(i.data))]
+
+  def own(i):
+    "Copy read-only (loaded) buffers into arrays we can append to."
+    data, ok = i.data, i.ok
+    i.data = [array(d.format, d.tobytes()) for d in data]
+    i.ok = [bytearray(one) for one in ok]
+    i.close(data + ok)
+
+  def close(i, views=None):
+    """
+    Let go of the buffers of a loaded store (`views`, default: all of
+    them) then, if memory-mapped, close the file.
+    """
+    views = i.data + i.ok if views is None else views
+    if i.mapped:
+      for v in views + [i._view]:
+        v.release()
+      if hasattr(i._mm, "close"):
+        i._mm.close()
+    i.mapped, i._mm, i._view = False, None, None
+
+  def __enter__(i):
+    return i
+
+  def __exit__(i, *_):
+    i.close()
+
+  def save(i, path, meta):
+    """
+    Write the store (and the extra `meta` dictionary) to `path`.
+    Each buffer starts on an 8 byte boundary.
+    """
+    def pad(n): return -n % 8
+    meta = dict(meta, n=i.n, order=sys.byteorder, words=i.words,
+                types=[getattr(d, "typecode", None) or d.format
+                       for d in i.data], blocks=[])
+    here = 0
+    for d, ok in zip(i.data, i.ok):
+      size = len(d) * d.itemsize
+      meta["blocks"] += [[here, here + size + pad(size)]]
+      here += size + pad(size) + len(ok) + pad(len(ok))
+    head = json.dumps(meta).encode()
+    head += b" " * pad(len(head))
+    with open(path, "wb") as fp:
+      fp.write(b"BNBAD001" + struct.pack("<Q", len(head)) + head)
+      for d, ok in zip(i.data, i.ok):
+        fp.write(bytes(d) + bytes(pad(len(d) * d.itemsize)))
+        fp.write(bytes(ok) + bytes(pad(len(ok))))
+
+  def load(path, mapped=True):
+    """
+    Return a store, and its meta dictionary, read from `path`.
+    If `mapped`, the column buffers are views into a memory-mapped
+    file (so nothing is read till it is used).
+    """
+    with open(path, "rb") as fp:
+      if mapped:
+        buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+      else:
+        buf = fp.read()
+    view = memoryview(buf)
+    assert bytes(view[:8]) == b"BNBAD001", "not a bnbad table"
+    size, = struct.unpack("<Q", view[8:16])
+    meta = json.loads(bytes(view[16:16 + size]))
+    start, n = 16 + size, meta["n"]
+    s = Store.__new__(Store)
+    s.n, s.mapped, s._mm, s._view = n, True, buf, view
+    s.nump = [t == "d" for t in meta["types"]]
+    s.words = meta["words"]
+    s.codes = [{w: k for k, w in enumerate(ws)} for ws in s.words]
+    s.data, s.ok = [], []
+    for t, (one, two) in zip(meta["types"], meta["blocks"]):
+      width = array(t).itemsize
+      s.data += [view[start + one:start + one + n * width].cast(t)]
+      s.ok += [view[start + two:start + two + n]]
+    if meta["order"] != sys.byteorder:
+      s.own()
+      [d.byteswap() for d in s.data]
+    return s, meta
+
+  def nbytes(i):
+    "Bytes used by the column buffers and masks."
+    return sum(len(d) * d.itemsize + len(ok)
+               for d, ok in zip(i.data, i.ok))
+
+
+def rid(row):
+  """
+  An id for a row, as a pair of ints (`Row` proxies are made on
+  demand, so for them, use their store and position). Like `id`,
+  this is only unique while the row (or its store) is alive.
+  """
+  return (id(row._s), row._r) if isinstance(row, Row) else (id(row), -1)
+
+
+class Row:
+  """
+  One row of a `Store`, with cells fetched as needed. Proxies are
+  made on demand, so two of them may stand for the same row: they
+  are equal (and hash the same) if their cells are equal. To ask if
+  they are the same row, compare their `rid`s.
+  """
+  __slots__ = ("_s", "_r")
+
+  def __init__(i, s, r):
+    i._s, i._r = s, r
+
+  def __getitem__(i, pos):
+    if isinstance(pos, slice):
+      return i._s.row(i._r)[pos]
+    return i._s.cell(i._r, pos)
+
+  def __len__(i):
+    return len(i._s.data)
+
+  def __iter__(i):
+    return iter(i._s.row(i._r))
+
+  def __eq__(i, j):
+    if not isinstance(j, (Row, list, tuple)):
+      return NotImplemented
+    return list(i) == list(j)
+
+  def __hash__(i):
+    return hash(tuple(i))
+
+  def __repr__(i):
+    return repr(i._s.row(i._r))
+
+
+class Rows:
+  """
+  The rows of a `Store`, as a sequence of `Row`s.
+  Supports `len`, indexing, slicing, iteration and `+=`
+  (so `Tab.add` works the same on lists or stores).
+  """
+  def __init__(i, store):
+    i.store = store
+
+  def __len__(i):
+    return i.store.n
+
+  def __getitem__(i, r):
+    if isinstance(r, slice):
+      return [Row(i.store, k) for k in range(i.store.n)[r]]
+    if r < 0:
+      r += i.store.n
+    if not 0 <= r < i.store.n:
+      raise IndexError(r)
+    return Row(i.store, r)
+
+  def __iter__(i):
+    return (Row(i.store, r) for r in range(i.store.n))
+
+  def __iadd__(i, rows):
+    [i.store.add(row) for row in rows]
+    return i
+
+
+class Picked:
+  """
+  Some of the rows of a sequence, picked out by an index
+  (so making one copies no rows).
+  """
+  def __init__(i, rows, idx):
+    i.rows, i.idx = rows, idx
+
+  def __len__(i):
+    return len(i.idx)
+
+  def __getitem__(i, k):
+    if isinstance(k, slice):
+      return [i.rows[j] for j in i.idx[k]]
+    return i.rows[i.idx[k]]
+
+  def __iter__(i):
+    return map(i.rows.__getitem__, i.idx)
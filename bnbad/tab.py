@@ -3,36 +3,134 @@ Storage of rows, and summaries of each column. Also,
 (a) methods to recursively group tables into sub-tables (recursively);
 (b) tools to find deltas between tables.
 """
-from .lib import cols, rows, shuffle
-from .lib import Thing
+from .lib import shuffle
+from .lib import Cache, Thing, o
 from .my import my
-from .col import Cols
+from .col import Cols, Magic, Num, Schema, Sketch, Sym
+from .store import Store, Rows, Picked, rid
 from .ranges import Ranges
+from .ingest import batches, pieces
+from .bits import Index, members
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from operator import mul
+import heapq
+import json
 import math
 import random
 
 
 class Tab(Thing):
-  def __init__(i, rows=[]):
-    i.rows, i.cols = [], Cols()
+  """
+  Rows, and summaries of the columns in those rows.
+  If `columnar` is set, rows are kept in a `Store`
+  (one typed array per column) and read back as `Row` proxies.
+  """
+  def __init__(i, rows=[], columnar=False):
+    i.rows, i.cols, i.columnar = [], Cols(), columnar
     [i.add(row) for row in rows]
 
   def clone(i, rows=[]):
-    t = Tab()
-    t + [c.txt for c in i.cols.all]
+    t = Tab(columnar=i.columnar)
+    t.use(i.cols.schema)
     [t + row for row in rows]
     return t
 
+  def use(i, schema):
+    "Make fresh column summaries (and storage) for a `Schema`."
+    i.cols = Cols(schema)
+    if i.columnar:
+      i.rows = Rows(Store(i.cols))
+
+  def view(i, idx):
+    "Return a `TabView` of the rows at positions `idx`."
+    return TabView(i, idx)
+
+  def schema(i):
+    return i.cols.schema
+
+  def pack(i):
+    """
+    Return a table of copies of our rows, with empty column summaries
+    (so it is cheap to send to another process).
+    """
+    t = Tab()
+    t.use(i.schema())
+    t.rows = [list(row) for row in i.rows]
+    return t
+
   def __add__(i, a):
-    return i.add(a) if i.cols.all else i.cols.header(a)
+    if i.cols.all:
+      return i.add(a)
+    i.use(Schema(a))
 
   def add(i, a):
     i.rows += [[c + a[c.pos] for c in i.cols.all]]
 
-  def read(i, data=None):
-    [i + row for row in cols(rows(data))]
+  def read(i, data=None, jobs=1):
+    """
+    Add rows from `data` (see `batches`). If `data` is a csv file
+    and `jobs` > 1, then summarize it in `jobs` processes, then merge
+    the column summaries from each process (see `pieces`).
+    """
+    if jobs > 1 and isinstance(data, str) and data[-3:] == "csv":
+      src = pieces(data, jobs)
+      i + next(src)
+      lasts = {pos: {} for pos in i.cols.syms}
+      for rows, cols, last in src:
+        for pos, seen in last.items():
+          lasts[pos].update((x, k + len(i.rows)) for x, k in seen.items())
+        i.rows += rows
+        i.cols.merge(cols)
+      [c.tie(lasts[c.pos]) for c in i.cols.syms.values()]
+      return i
+    for batch in batches(data):
+      [i + row for row in batch]
     return i
 
+  def save(i, path):
+    """
+    Write this table to a binary file: the header, the role of
+    each column, the column summaries and the typed column data.
+    Symbol counts are written as `[symbol, count]` pairs (since
+    json would turn their keys into strings).
+    """
+    s = i.rows.store if i.columnar else Store(i.cols)
+    if not i.columnar:
+      [s.add(row) for row in i.rows]
+    header = [c.txt for c in i.cols.all]
+    s.save(path, dict(
+        header=header, roles=i.schema().role,
+        cols=[{k: list(v.items()) if k in ("seen", "over") else
+               getattr(v, "__dict__", v) for k, v in c.__dict__.items()}
+              for c in i.cols.all]))
+
+  def load(path, mmap=True):
+    """
+    Return a (columnar) table read from a file written by `save`.
+    Column roles and summaries are restored, not recomputed. If `mmap`,
+    the column data is paged in from disk only when it is used (and
+    the file stays open till `close`).
+    """
+    s, meta = Store.load(path, mapped=mmap)
+    t = Tab(columnar=True)
+    t.use(Schema(meta["header"], meta["roles"]))
+    for c, d in zip(t.cols.all, meta["cols"]):
+      c.__dict__.update(d)
+      for k in ("seen", "over"):
+        if k in d:
+          c.__dict__[k] = dict(d[k])
+      if isinstance(d.get("some"), dict):
+        c.some = Sketch()
+        c.some.__dict__.update(d["some"])
+    t.rows = Rows(s)
+    return t
+
+  def close(i):
+    "Close the file (if any) that our rows are memory-mapped from."
+    if i.columnar:
+      i.rows.store.close()
+
   def status(i):
     return '{' + ', '.join([('%.2f' % c.mid())
                             for c in i.cols.y.values()]) + '}'
@@ -49,31 +147,259 @@ class Tab(Thing):
       s2 -= math.e**(c.w * (y - x) / n)
     return s1 / n < s2 / n
 
+  def exps(i, rows):
+    """
+    For each row, `e` to the power of each (weighted, normalized) goal,
+    then of their negatives. Since `e**(x-y) = e**x * e**-y`, `better`
+    is then just a compare of two dot products (see `beats`), with no
+    calls to `norm` or `**`.
+    """
+    cs, n = list(i.cols.y.values()), len(i.cols.y) + 0.0001
+    out = []
+    for row in rows:
+      xs = [c.w * c.norm(row[c.pos]) / n for c in cs]
+      out += [([math.e**x for x in xs], [math.e**-x for x in xs])]
+    return out
+
+  def better_matrix(i, rows1, rows2=None):
+    """
+    For each of `rows1`, is it `better` than each of `rows2`
+    (default: `rows1`)? The `exps` of each row are found just once.
+    """
+    es = i.exps(rows1)
+    return beaten(es, es if rows2 is None else i.exps(rows2))
+
+  def dom_counts(i, rows=None, sample=None):
+    """
+    For each of `rows` (default: all our rows), how many of `rows` is
+    it `better` than? That needs n*n compares so, given a `sample`
+    size k < n, just count wins over k random rows, times n/k.
+    """
+    rows = i.rows if rows is None else rows
+    if not rows:
+      return []
+    es = i.exps(rows)
+    some = es
+    if sample and sample < len(es):
+      some = random.sample(es, sample)
+    n = len(es) / len(some)
+    out = []
+    for a in es:
+      wins = sum([beats(a, b) for b in some])
+      out += [wins if some is es else wins * n]
+    return out
+
+
+def beats(a, b):
+  "Given `exps` of two rows, is the first `better` than the second?"
+  return sum(map(mul, a[0], b[1])) > sum(map(mul, b[0], a[1]))
+
+
+def beaten(es1, es2):
+  """
+  Given the `exps` of some rows, is each of `es1` `better` than
+  each of `es2`? When they are the same rows, each dot product
+  is needed twice, so only compute them once.
+  """
+  if es1 is not es2:
+    return [[beats(a, b) for b in es2] for a in es1]
+  dots = [[sum(map(mul, a[0], b[1])) for b in es1] for a in es1]
+  return [[x > dots[b][a] for b, x in enumerate(row)]
+          for a, row in enumerate(dots)]
+
+
+class TabView(Tab):
+  """
+  A read-only table holding some of the rows of another table.
+  This is just an index into the rows of the `Tab` that really
+  stores them, so splitting a view costs one index write per row.
+  Column summaries are only computed when first needed
+  (e.g. by `mid`, `status` or `better`).
+  """
+  def __init__(i, t, idx):
+    i._t, i.idx, i._cols = t, array('l', idx), None
+    i.columnar = t.columnar
+
+  @property
+  def rows(i):
+    return Picked(i._t.rows, i.idx)
+
+  @property
+  def cols(i):
+    if i._cols is None:
+      i._cols = Cols(i._t.schema())
+      for row in i.rows:
+        [c + row[c.pos] for c in i._cols.all]
+    return i._cols
+
+  def view(i, idx):
+    return TabView(i._t, [i.idx[k] for k in idx])
+
+  def schema(i):
+    return i._t.schema()
+
+  def put(i, k, row):
+    "Add `row`, at position `k` of the real table, to this view."
+    i.idx.append(k)
+    if i._cols is not None:
+      [c + row[c.pos] for c in i._cols.all]
+
+  def clone(i, rows=[]):
+    return i._t.clone(rows)
+
 
 class Dist(Thing):
-  def __init__(i, t, cols=None, rows=None, p=my.p):
+  """
+  Distances between rows, using the columns `cols` of table `t`.
+  `dist` does one pair at a time. `dists` and `pairwise` do many pairs
+  at once, after `prep` converts rows to columns of normalized numbers
+  (None if missing) and integer symbol codes (-1 if missing).
+  Both paths apply the same missing value rules as `Num.dist` and
+  `Sym.dist`, so they return the same distances.
+
+  If given a `cache` (anything with `get(key)` and `put(key,value)`,
+  e.g. a `Cache`), distances are remembered, keyed on the `rid`s of
+  the two rows. Each entry also holds its two rows so, while it is
+  cached, their ids cannot be reused by other rows.
+
+  If `index` is set, `nearest` and `faraway` use a `VpTree`
+  over our rows (so they need not look at all of them).
+  """
+  def __init__(i, t, cols=None, rows=None, p=my.p, cache=None,
+               index=False):
     i.t = t
     i.p = p
     i.cols = cols or t.cols.x
     i.rows = rows or shuffle(t.rows)[:my.d]
+    i.cache = cache
+    i._codes = {pos: {} for pos in i.cols}
+    i._mat = None
+    i._index = VpTree(i, i.rows) if index else None
+
+  def pack(i):
+    """
+    A copy of this `Dist`, with copies of our rows, but no table and
+    no cache (so it is cheap to send to another process).
+    """
+    d = Dist.__new__(Dist)
+    d.__dict__.update(i.__dict__, t=None, cache=None, _mat=None,
+                      rows=[list(row) for row in i.rows])
+    d._index = VpTree(d, d.rows) if i._index else None
+    return d
+
+  def key(i, row1, row2):
+    a, b = rid(row1), rid(row2)
+    return (a, b) if a <= b else (b, a)
 
   def dist(i, row1, row2):
+    if i.cache is None:
+      return i.raw(row1, row2)
+    key = i.key(row1, row2)
+    hit = i.cache.get(key)
+    if hit is None:
+      hit = i.cache.put(key, (i.raw(row1, row2), row1, row2))
+    return hit[0]
+
+  def raw(i, row1, row2):
+    "Distance between two rows (ignoring the cache)."
     d = 0
     for col in i.cols.values():
       inc = col.dist(row1[col.pos], row2[col.pos])
-      d += inc**my.p
-    return (d / len(i.cols))**(1 / my.p)
+      d += inc**i.p
+    return (d / len(i.cols))**(1 / i.p)
+
+  def prep(i, rows):
+    "Convert `rows` into one list of values per column."
+    out = []
+    for pos, col in i.cols.items():
+      if isinstance(col, Sym):
+        codes = i._codes[pos]
+        out += [[-1 if x == "?" else codes.setdefault(x, len(codes))
+                 for x in (row[pos] for row in rows)]]
+      else:
+        lo, gap = col.lo, col.hi - col.lo + 0.000001
+        out += [[None if x == "?" else (x - lo) / gap
+                 for x in (row[pos] for row in rows)]]
+    return out
+
+  def mat(i):
+    "The prepared columns of the rows we sample."
+    if i._mat is None:
+      i._mat = i.prep(i.rows)
+    return i._mat
+
+  def kernel(i, v, m):
+    """
+    Distances from one prepared row `v` to every row in the prepared
+    columns `m`. Works column by column, with special cases for p=1,2.
+    """
+    d = [0] * (len(m[0]) if m else 0)
+    for a, b, col in zip(v, m, i.cols.values()):
+      if isinstance(col, Sym):
+        inc = [1] * len(b) if a == -1 else [a != y for y in b]
+      else:
+        hi, mu = col.norm(col.hi), col.norm(col.mu)
+        if a is None:
+          inc = [1 if y is None else abs((0 if y > mu else hi) - y)
+                 for y in b]
+        else:
+          z = 0 if a > mu else hi
+          inc = [abs(a - z) if y is None else abs(a - y) for y in b]
+      if i.p == 1:
+        d = [s + x for s, x in zip(d, inc)]
+      elif i.p == 2:
+        d = [s + x * x for s, x in zip(d, inc)]
+      else:
+        d = [s + x**i.p for s, x in zip(d, inc)]
+    n = len(i.cols)
+    if i.p == 1:
+      return [s / n for s in d]
+    if i.p == 2:
+      return [(s / n)**0.5 for s in d]
+    return [(s / n)**(1 / i.p) for s in d]
+
+  def dists(i, row, rows=None):
+    "Distances from `row` to each of `rows` (default: our sample)."
+    if i.cache is not None:
+      return i.cached(row, i.rows if rows is None else rows)
+    m = i.mat() if rows is None else i.prep(rows)
+    return i.kernel([x[0] for x in i.prep([row])], m)
+
+  def cached(i, row, rows):
+    "`dists`, using the cache, then computing any misses in bulk."
+    keys = [i.key(row, r) for r in rows]
+    out = [i.cache.get(k) for k in keys]
+    todo = [n for n, hit in enumerate(out) if hit is None]
+    if todo:
+      m = i.prep([rows[n] for n in todo])
+      for n, d in zip(todo, i.kernel([x[0] for x in i.prep([row])], m)):
+        out[n] = i.cache.put(keys[n], (d, row, rows[n]))
+    return [hit[0] for hit in out]
+
+  def pairwise(i, rows1, rows2):
+    "Distances from each of `rows1` to each of `rows2`."
+    m = i.prep(rows2)
+    return [i.kernel(v, m) for v in zip(*i.prep(rows1))]
 
   def neighbors(i, r1):
-    a = [(i.dist(r1, r2), r2) for r2 in i.rows if id(r1) != id(r2)]
+    me = rid(r1)
+    a = [(d, r2) for d, r2 in zip(i.dists(r1), i.rows) if rid(r2) != me]
     return sorted(a, key=lambda z: z[0])
 
+  def nearest(i, row, k=1):
+    "The `k` nearest (distance,row) pairs to `row`."
+    if i._index:
+      return i._index.knn(row, k)
+    return i.neighbors(row)[:k]
+
   def faraway(i, row):
+    if i._index:
+      return i._index.far(row, my.f)
     a = i.neighbors(row)
     return a[int(len(a) * my.f)][1]
 
-  def poles(i):
-    tmp = random.choice(i.rows)
+  def poles(i, rng=random):
+    tmp = rng.choice(i.rows)
     left = i.faraway(tmp)
     right = i.faraway(left)
     return left, right, i.dist(left, right)
@@ -88,20 +414,190 @@ class Dist(Thing):
       d = 0
     return d
 
+  def projects(i, rows, left, right, c):
+    "`project` each of `rows`, in bulk."
+    if i.cache is None:
+      m = i.prep(rows)
+      a = i.kernel([x[0] for x in i.prep([left])], m)
+      b = i.kernel([x[0] for x in i.prep([right])], m)
+    else:
+      a, b = i.dists(left, rows), i.dists(right, rows)
+    return [min(1, max(0, (x * x + c * c - y * y) / (2 * c)))
+            for x, y in zip(a, b)]
+
+
+class VpTree(Thing):
+  """
+  Vantage point tree, over some `rows`, using the metric of a `Dist`
+  (so it handles numerics, symbols and any Minkowski `p`).
+  Each node picks a row (the vantage point), then splits the other
+  rows into those nearer/further than the median distance `mu`.
+  Nodes are `o` objects holding `n` (size) and either `rows` (in
+  leaves) or `vp`, `mu`, `near` and `far` (everywhere else).
+  """
+  def __init__(i, dist, rows, leaf=8):
+    i._dist, i.leaf = dist, leaf
+    i.root = i.grow(list(rows))
+
+  def grow(i, rows):
+    if len(rows) <= i.leaf:
+      return o(n=len(rows), rows=rows)
+    vp, rest = rows[0], rows[1:]
+    order = sorted(zip(i._dist.dists(vp, rest), range(len(rest))))
+    half = len(order) // 2
+    return o(n=len(rows), vp=vp, mu=order[half][0],
+             near=i.grow([rest[k] for _, k in order[:half]]),
+             far=i.grow([rest[k] for _, k in order[half:]]))
+
+  def knn(i, row, k=1):
+    """
+    Return the `k` nearest (distance,row) pairs to `row` (nearest
+    first). Skip any subtree that cannot hold anything nearer than
+    the `k`-th best found so far.
+    """
+    me, best, seen = rid(row), [], [0]
+
+    def keep(d, r):
+      if rid(r) != me:
+        seen[0] += 1
+        item = (-d, seen[0], r)
+        if len(best) < k:
+          heapq.heappush(best, item)
+        elif d < -best[0][0]:
+          heapq.heapreplace(best, item)
+
+    def tau():
+      return -best[0][0] if len(best) == k else math.inf
+
+    def visit(node):
+      if "rows" in node.__dict__:
+        [keep(d, r) for d, r in zip(i._dist.dists(row, node.rows),
+                                    node.rows)]
+        return
+      x = i._dist.dist(row, node.vp)
+      keep(x, node.vp)
+      if x < node.mu:
+        visit(node.near)
+        if x + tau() >= node.mu:
+          visit(node.far)
+      else:
+        visit(node.far)
+        if x - tau() <= node.mu:
+          visit(node.near)
+    visit(i.root)
+    return [(-d, r) for d, _, r in sorted(best, reverse=True)]
+
+  def far(i, row, f=my.f, budget=None):
+    """
+    Return a row that is (about) `f` of the way out, in the sorted
+    distances from `row`. Expand the tree, breadth first, into at most
+    `budget` (default: `my.Ib` times the square root of the number of
+    rows) representatives: each row seen so far stands for itself,
+    and each unexpanded subtree is stood for by one of its rows,
+    weighted by its size.
+    """
+    budget = budget or int(my.Ib * i.root.n**0.5)
+    reps, todo = [], [i.root]
+    while todo and len(reps) + len(todo) < budget:
+      node = todo.pop(0)
+      if "rows" in node.__dict__:
+        reps += [(r, 1) for r in node.rows]
+      else:
+        reps += [(node.vp, 1)]
+        todo += [node.near, node.far]
+    reps += [(node.rows[0] if "rows" in node.__dict__ else node.vp, node.n)
+             for node in todo if node.n]
+    me = rid(row)
+    reps = [(r, w) for r, w in reps if rid(r) != me]
+    ds = i._dist.dists(row, [r for r, _ in reps])
+    order = sorted(zip(ds, range(len(reps))), key=lambda z: z[0])
+    want, n = f * sum(w for _, w in reps), 0
+    for _, k in order:
+      n += reps[k][1]
+      if n > want:
+        return reps[k][0]
+    return reps[order[-1][1]][0]
+
 
 class Cluster(Thing):
   pass
 
 
 class Tree(Cluster):
-  def __init__(i, t, cols=my.c):
+  """
+  Recursively split a table in two, at the median of the rows'
+  projections onto two distant poles.
+  New rows can be added later, without a rebuild (see `insert`).
+
+  If `seeded`, the sample used by `Dist` and each split use their
+  own random numbers, seeded from `my.r` (and the node's `path` from
+  the root), so the tree is the same, whatever the number of `jobs`
+  (and the caller's random numbers are left alone). If `jobs` > 1,
+  the subtrees at depth `my.z` are grown in `jobs` processes, then
+  gathered back into this tree. That is always `seeded` (so it
+  builds the same tree as `seeded=True` with one job).
+  """
+  def __init__(i, t, cols=my.c, jobs=1, seeded=False):
+    jobs = jobs or 1
     i.lo = 2 * len(t.rows)**my.s
-    i.leaves = []
-    i.dist = Dist(t, cols=t.cols.__dict__[cols])
-    i.root = TreeNode(t, None, i, lvl=0)
-    for j in i.leaves:
-      j.dom = sum([t.better(j.t.mid(), k.t.mid())
-                   for k in i.leaves])
+    i.leaves, i.seeded, i.pool, i._pending = [], seeded or jobs > 1, None, {}
+    some = None
+    if i.seeded:
+      some = shuffle(list(t.rows), random.Random(my.r))[:my.d]
+    i.dist = Dist(t, cols=t.cols.__dict__[cols], rows=some,
+                  cache=Cache(my.C) if my.C else None, index=my.I)
+    if jobs > 1:
+      with ProcessPoolExecutor(jobs) as i.pool:
+        i.root = TreeNode(t, None, i, lvl=0)
+        i.gather(i.root)
+      i.pool = None
+      i.leaves = [node for node in i.root.nodes() if node.id is not None]
+      i.renumber()
+    else:
+      i.root = TreeNode(t, None, i, lvl=0)
+    i.rank()
+
+  def rank(i):
+    """
+    Set the `dom` of each leaf to the number of leaves it is `better`
+    than. Each leaf's `mid` (and its `exps`) is found once, then all
+    the pairs are compared in one pass (see `beaten`). Beyond
+    `my.nds` leaves, use the (faster) count from `fronts` instead.
+    """
+    mids = [j.t.mid() for j in i.leaves]
+    es = i.root.t.exps(mids)
+    for j, e in zip(i.leaves, es):
+      j.scored = e
+    if len(i.leaves) > my.nds:
+      return i.fronts(mids)
+    for j, wins in zip(i.leaves, beaten(es, es)):
+      j.dom = sum(wins)
+
+  def fronts(i, mids):
+    """
+    Non-dominated sort of the leaves (using the efficient sequential
+    search of Zhang et al. 2015): sort leaves (best first), then put
+    each one in the first front where nothing dominates it. Set each
+    leaf's `dom` to the number of leaves in worse fronts.
+    """
+    cs = list(i.root.t.cols.y.values())
+    gs = [[c.w * c.norm(mid[c.pos]) for c in cs] for mid in mids]
+
+    def dominates(a, b):
+      return all(x >= y for x, y in zip(a, b)) and a != b
+    out = []
+    for k in sorted(range(len(gs)), key=lambda k: gs[k], reverse=True):
+      for front in out:
+        if not any(dominates(gs[m], gs[k]) for m in reversed(front)):
+          front += [k]
+          break
+      else:
+        out += [[k]]
+    worse = len(gs)
+    for front in out:
+      worse -= len(front)
+      for k in front:
+        i.leaves[k].dom = worse
 
   def show(i):
     "Show the tree."
@@ -117,30 +613,240 @@ class Tree(Cluster):
     rest = shuffle(rest)[:len(best.rows) * my.N]
     return best, i.root.t.clone(rest), i.leaves[-1].t
 
+  def grow(i, t, up, lvl, path):
+    """
+    Return a new node for the rows of `t`. But if we have a pool,
+    and are at depth `my.z`, then start a job to grow that node
+    (and return `None`, to be swapped out later by `gather`).
+    """
+    if i.pool and lvl == my.z and len(t.rows) >= i.lo:
+      i._pending[path] = (t, i.pool.submit(
+          subtree, t.pack(), i.dist.pack(), i.lo, lvl, path, i.seeded))
+      return None
+    return TreeNode(t, up, i, lvl, path)
+
+  def gather(i, node):
+    "Swap in the subtrees grown by other processes."
+    for k, kid in enumerate(node.kids):
+      if kid is None:
+        t, job = i._pending.pop(node.path + str(k))
+        kid = node.kids[k] = job.result()
+        kid._up = node
+        for one in kid.nodes():
+          one._root = i
+          one.t = t.view(one.t.idx) if one is not kid else t
+      i.gather(kid)
+
+  def export(i, path=None):
+    """
+    Return (and, given a `path`, save as json) just the structure of
+    the tree: the distance columns (and their ranges), then for each
+    node its poles (as prepared vectors, see `Dist.prep`), `c` and `mid`
+    (or, for leaves, their `id`). Then the size, `mid` and `dom` of each
+    leaf. Load this with `Router`.
+    """
+    d = i.dist
+
+    def node(one):
+      if not one.kids:
+        return dict(id=one.id)
+      return dict(l=[x[0] for x in d.prep([one.l])],
+                  r=[x[0] for x in d.prep([one.r])],
+                  c=one.c, mid=one.mid, kids=[node(kid) for kid in one.kids])
+    out = dict(p=d.p, root=node(i.root))
+    out["cols"] = [dict(pos=c.pos, txt=c.txt, num=isinstance(c, Num),
+                        lo=getattr(c, "lo", 0), hi=getattr(c, "hi", 0),
+                        mu=getattr(c, "mu", 0), codes=d._codes[pos])
+                   for pos, c in d.cols.items()]
+    out["leaves"] = [dict(n=len(j.t.rows), mid=j.t.mid(), dom=j.dom)
+                     for j in sorted(i.leaves, key=lambda z: z.id)]
+    if path:
+      with open(path, "w") as fp:
+        json.dump(out, fp)
+    return out
+
+  def renumber(i):
+    for k, leaf in enumerate(i.leaves):
+      leaf.id = k
+
+  def insert(i, row):
+    "Add one `row` to the tree. Return the leaf where it lands."
+    return i.insert_many([row])[0]
+
+  def insert_many(i, rows):
+    """
+    Add `rows` to the tree, without a rebuild. Each row is added to
+    the table at the root, then routed down the tree (using the
+    poles and `mid` of each node), so it costs O(depth) distances.
+    Leaves that grow past `my.W` times the minimum split size are
+    split. Then the `dom` of each leaf that changed is recounted
+    (and its wins against every other leaf are refreshed).
+    But if the new rows moved the range of any goal, or distance,
+    column then every old normalized value is stale, so the cached
+    distances are dropped and all the leaves are ranked again.
+    Return the leaf reached by each row (or, as in `__init__`, the
+    node that could not be split, and so is not one of our `leaves`).
+    """
+    t = i.root.t
+    base = t._t if isinstance(t, TabView) else t
+    before = i.ranges()
+    out, todo = [], {}
+    for row in rows:
+      base.add(row)
+      k, row = len(base.rows) - 1, base.rows[-1]
+      node = i.root
+      while True:
+        if node.t is not base:
+          node.t.put(k, row)
+        if not node.kids:
+          break
+        x = i.dist.project(row, node.l, node.r, node.c)
+        node = node.kids[x >= node.mid]
+      out += [node]
+      if node.id is not None:
+        todo[id(node)] = node
+    moved = i.ranges() != before
+    if moved:
+      i.dist._mat = None
+      if i.dist.cache is not None:
+        i.dist.cache = Cache(i.dist.cache.size)
+    few = not moved and len(i.leaves) <= my.nds
+    for leaf in todo.values():
+      if few:
+        i.unscore(leaf)
+      i.leaves.remove(leaf)
+      new = [leaf]
+      if len(leaf.t.rows) > my.W * i.lo and leaf.split():
+        leaf.id = None
+        new = [one for one in leaf.nodes() if one.id is not None]
+        drop = {id(one) for one in new}
+        i.leaves = [one for one in i.leaves if id(one) not in drop]
+      for one in new:
+        i.leaves += [one]
+        if few:
+          i.score(one)
+    i.renumber()
+    if not few:
+      i.rank()
+    return out
+
+  def ranges(i):
+    "The `lo`,`hi` of the goal and distance columns that are numbers."
+    cs = list(i.root.t.cols.y.values()) + list(i.dist.cols.values())
+    return [(c.lo, c.hi) for c in cs if isinstance(c, Num)]
+
+  def unscore(i, leaf):
+    "Remove the wins (by other leaves) against `leaf`."
+    for k in i.leaves:
+      if k is not leaf:
+        k.dom -= beats(k.scored, leaf.scored)
+
+  def score(i, leaf):
+    """
+    Count the wins of (and against) a new, or changed, `leaf`
+    (which has just been added to the end of our `leaves`).
+    """
+    leaf.scored = i.root.t.exps([leaf.t.mid()])[0]
+    leaf.dom = sum([beats(leaf.scored, k.scored) for k in i.leaves])
+    for k in i.leaves:
+      if k is not leaf:
+        k.dom += beats(k.scored, leaf.scored)
+
+
+def subtree(t, dist, lo, lvl, path, seeded):
+  "Worker for `Tree`: grow the subtree at `path`, in another process."
+  root = Tree.__new__(Tree)
+  root.lo, root.dist, root.leaves = lo, dist, []
+  root.seeded, root.pool, root._pending = seeded, None, {}
+  node = TreeNode(t, None, root, lvl, path)
+  for one in node.nodes():
+    one._root = None
+  return node
+
+
+class Router(Thing):
+  """
+  Route rows to the leaves of a `Tree`, using only what
+  `Tree.export` saved (so no tables are needed). Rows are routed
+  in bulk: at each node, all the rows that reach it are projected
+  onto its poles at once (with `Dist.kernel`), then sent left or right.
+  """
+  def __init__(i, tree):
+    i.root, i.leaves = tree["root"], tree["leaves"]
+    i.dist = Dist.__new__(Dist)
+    i.dist.__dict__.update(t=None, p=tree["p"], rows=[], cache=None,
+                           cols={}, _codes={}, _mat=None, _index=None)
+    for c in tree["cols"]:
+      col = (Num if c["num"] else Sym)(c["pos"], c["txt"])
+      if c["num"]:
+        col.lo, col.hi, col.mu = c["lo"], c["hi"], c["mu"]
+      i.dist.cols[col.pos] = col
+      i.dist._codes[col.pos] = dict(c["codes"])
+
+  def load(path):
+    "Return a `Router` for a tree saved by `Tree.export`."
+    with open(path) as fp:
+      return Router(json.load(fp))
+
+  def route(i, rows):
+    """
+    Return the leaf id reached by each of `rows` (or None, for
+    nodes that were too big to be leaves, but could not be split).
+    """
+    m = i.dist.prep(rows)
+    out, todo = [None] * len(rows), [(i.root, range(len(rows)))]
+    while todo:
+      node, idx = todo.pop()
+      if "kids" not in node:
+        for k in idx:
+          out[k] = node["id"]
+        continue
+      some = [[col[k] for k in idx] for col in m]
+      a = i.dist.kernel(node["l"], some)
+      b = i.dist.kernel(node["r"], some)
+      c, mid, go = node["c"], node["mid"], [[], []]
+      for k, x, y in zip(idx, a, b):
+        go[min(1, max(0, (x * x + c * c - y * y) / (2 * c))) >= mid] += [k]
+      todo += [(kid, one) for kid, one in zip(node["kids"], go) if one]
+    return out
+
 
 class TreeNode:
-  def __init__(i, t, _up, _root, lvl):
+  def __init__(i, t, _up, _root, lvl, path=""):
     i.t = t
     i._up = _up
     i.kids = []
     i._root = _root
+    i.path, i.lvl, i.id = path, lvl, None
     i.l, i.r = None, None
     i.c, i.mid, i.dom = 0, 0, 0
     if len(t.rows) < _root.lo:
       i._root.leaves += [i]
       i.id = len(i._root.leaves) - 1
     else:
-      d = i._root.dist
-      i.l, i.r, i.c = d.poles()
-      xs = [d.project(r, i.l, i.r, i.c) for r in t.rows]
-      i.mid = sum(xs) / len(xs)
-      tables = [t.clone(), t.clone()]
-      for x, r in zip(xs, t.rows):
-        tables[x >= i.mid].add(r)
-      if len(tables[0].rows) < len(t.rows) and \
-         len(tables[1].rows) < len(t.rows):
-        for t1 in tables:
-          i.kids += [TreeNode(t1, i, _root, lvl + 1)]
+      i.split()
+
+  def split(i):
+    "Divide our rows in two, between two new kids (if we can)."
+    d = i._root.dist
+    rng = random.Random(f"{my.r}:{i.path}") if i._root.seeded else random
+    i.l, i.r, i.c = d.poles(rng)
+    xs = d.projects(i.t.rows, i.l, i.r, i.c)
+    i.mid = sum(xs) / len(xs)
+    idx = [[], []]
+    for k, x in enumerate(xs):
+      idx[x >= i.mid].append(k)
+    if len(idx[0]) < len(xs) and len(idx[1]) < len(xs):
+      for k, one in enumerate(idx):
+        i.kids += [i._root.grow(i.t.view(one), i, i.lvl + 1,
+                                i.path + str(k))]
+    return i.kids
+
+  def nodes(i):
+    "This node, and all those below it."
+    yield i
+    for kid in i.kids:
+      yield from kid.nodes()
 
   def show(i, pre):
     s = f"{pre}{len(i.t.rows)}"
@@ -156,39 +862,197 @@ class TreeNode:
 
 
 class DecisionList(Thing):
-  def __init__(i, ok, bad, _up=None, lvl=my.H):
+  def __init__(i, ok, bad, _up=None, lvl=my.H, _sorts=None, jobs=1,
+               _pool=None, bits=False):
     """\
     What range best selects for `ok` while avoiding `bad`?
     Split on that decision.  Recurse.
+    If `jobs` > 1, the ranges of each column are found in `jobs`
+    processes (and the same decisions are made as with one job).
+    If `bits`, the rows matching each decision are found with
+    bitmap indexes (see `Index`), not by testing every row.
     """
+    if jobs > 1 and _pool is None:
+      with ProcessPoolExecutor(jobs) as pool:
+        return i.__init__(ok, bad, _up, lvl, _sorts, _pool=pool, bits=bits)
     i.kid, i._up, i.leaf = None, _up, ok.clone()
     if lvl > 0 and len(ok.rows) >= my.M:
-      i.decide, i.col, i.txt = i.decision(ok, bad)
-      ok1 = ok.clone()
-      bad1 = ok.clone()
-      for row in ok.rows:
-        (i.leaf if i.decide.matches(row) else ok1).add(row)
-      for row in bad.rows:
-        (i.leaf if i.decide.matches(row) else bad1).add(row)
-      i.kid = DecisionList(ok1, bad1, _up=i, lvl=lvl - 1)
+      i._sorts = s = _sorts or i.presort(ok, bad, bits)
+      i.decide, i.col, i.txt = i.decision(ok, bad, _pool)
+      if s.index:
+        ok1, bad1, rest = i.partition()
+      else:
+        ok1, bad1, rest = [], [], None
+        for t, out in [(ok, ok1), (bad, bad1)]:
+          for k, row in enumerate(t.rows):
+            if i.decide.matches(row):
+              i.leaf.add(row)
+            else:
+              out += [k]
+        ok1, bad1 = [s.ok[k] for k in ok1], [s.bad[k] for k in bad1]
+      more = lvl > 1 and len(ok1) >= my.M
+      i.kid = DecisionList(s.top[0].view(ok1),
+                           s.top[1].view([k - s.n for k in bad1]),
+                           _up=i, lvl=lvl - 1,
+                           _sorts=i.narrow(ok1, bad1, rest) if more else None,
+                           _pool=_pool)
     else:
       for row in ok.rows:
         i.leaf.add(row)
       for row in bad.rows:
         i.leaf.add(row)
 
-  def decision(i, ok, bad):
+  def presort(i, ok, bad, bits=False):
+    """
+    Sort the rows of `ok` and `bad` on each numeric x column, just
+    once, at the top of the list (like presorting in CART). Return
+    the rows, how many are `ok` (they come first), the `top` tables
+    `ok` and `bad`, the ids of the rows still in play, and (for each
+    column) sorted `(x, id)` pairs. If `bits`, also return an `Index`
+    of the rows, and the sets of `ok` and `bad` rows in play.
+    """
+    rows = list(ok.rows) + list(bad.rows)
+    idx = {}
+    for col in i.leaf.cols.x.values():
+      if Magic.nump(col.txt):
+        xs = ((row[col.pos], k) for k, row in enumerate(rows))
+        idx[col.pos] = sorted([(x, k) for x, k in xs if not Magic.no(x)],
+                              key=lambda z: z[0])
+    n, m = len(ok.rows), len(rows)
+    return o(rows=rows, n=n, top=(ok, bad), idx=idx,
+             ok=list(range(n)), bad=list(range(n, m)),
+             index=Index(rows, idx) if bits else None,
+             bits=((1 << n) - 1, (1 << m) - (1 << n)))
+
+  def narrow(i, ok, bad, bits=None):
+    """
+    Given the ids of the `ok` and `bad` rows (and, maybe, the sets
+    of those rows) passed on to our kid, filter our sorted pairs down
+    to those rows (so they stay sorted, with no need to sort them again).
+    """
+    s = i._sorts
+    keep = bytearray(len(s.rows))
+    for k in ok + bad:
+      keep[k] = 1
+    return o(rows=s.rows, n=s.n, top=s.top, ok=ok, bad=bad,
+             index=s.index, bits=bits,
+             idx={pos: [z for z in lst if keep[z[1]]]
+                  for pos, lst in s.idx.items()})
+
+  def partition(i):
+    """
+    With bitmaps: find the set of rows matching our decision, add
+    those rows to our leaf, then return the ids (and the sets) of the
+    `ok` and `bad` rows that did not match.
+    """
+    s = i._sorts
+    hit = s.index.of(i.col, i.decide.lo, i.decide.hi, Magic.nump(i.txt))
+    ok, bad = s.bits
+    for k in members(ok & hit) + members(bad & hit):
+      i.leaf.add(s.rows[k])
+    rest = (ok & ~hit, bad & ~hit)
+    return members(rest[0]), members(rest[1]), rest
+
+  def decision(i, ok, bad, pool=None):
     """Return the range and column that
-    best selects for `ok` while avoiding `bad`."""
-    best, out = 0, None
-    for col in ok.cols.x.values():
-      all = [[row[col.pos], True] for row in ok.rows]
-      all += [[row[col.pos], False] for row in bad.rows]
-      for one in Ranges(col.txt, all, get=col.pos).ranges:
-        if one.s() > best + my.e:
-          best, out = one.s(), one
+    best selects for `ok` while avoiding `bad`.
+    Given a `pool` of processes, score the ranges of each column
+    there, then (as if working serially) pick the first range, in
+    column order, that scores better than all before it."""
+    best, at, s = 0, None, i._sorts
+    cols = list(i.leaf.cols.x.values())
+    alls = [i.pairs(col, ok, bad) for col in cols]
+    ready = [col.pos in s.idx for col in cols]
+    if pool:
+      found = pool.map(scores, [c.txt for c in cols], alls, ready)
+    else:
+      rs = [list(Ranges(col.txt, all, get=col.pos, presorted=yes).ranges)
+            for col, all, yes in zip(cols, alls, ready)]
+      found = [[one.s() for one in ranges] for ranges in rs]
+    for c, ss in enumerate(found):
+      for k, one in enumerate(ss):
+        if one > best + my.e:
+          best, at = one, (c, k)
+    c, k = at
+    if pool:
+      col = cols[c]
+      out = list(Ranges(col.txt, alls[c], get=col.pos,
+                        presorted=ready[c]).ranges)[k]
+    else:
+      out = rs[c][k]
     return out, out._ranges.get, out._ranges.txt
 
+  def pairs(i, col, ok, bad):
+    "The `[x, is it ok?]` pairs to pass to `Ranges`, for one column."
+    s = i._sorts
+    if col.pos in s.idx:
+      return [(x, k < s.n) for x, k in s.idx[col.pos]]
+    all = [[row[col.pos], True] for row in ok.rows]
+    all += [[row[col.pos], False] for row in bad.rows]
+    return all
+
+  def rules(i):
+    """
+    The decisions down the list, as `(pos, lo, hi, num)`. Leaf `k`
+    gets the rows that match rule `k` (but no rule before it); the
+    last leaf gets the rows that match no rule.
+    """
+    out, d = [], i
+    while d.kid:
+      out += [(d.col, d.decide.lo, d.decide.hi, Magic.nump(d.txt))]
+      d = d.kid
+    return out
+
+  def source(i, name="leaf"):
+    """
+    Return standalone Python source for two functions: `name(row)`,
+    which returns the leaf index of a row, and `name`s(rows).
+    """
+    rules = i.rules()
+    lines = [f"def {name}(row):",
+             '  "Which leaf of a decision list does `row` fall into?"']
+    for k, (pos, lo, hi, num) in enumerate(rules):
+      lines += [f"  x = row[{pos}]",
+                f"  if x != '?' and {lo!r} <= x <= {hi!r}:" if num else
+                f"  if x == {lo!r}:",
+                f"    return {k}"]
+    lines += [f"  return {len(rules)}", "", "",
+              f"def {name}s(rows):",
+              f"  return list(map({name}, rows))", ""]
+    return "\n".join(lines)
+
+  def compile(i):
+    """
+    Return a function that maps many rows to their leaf indexes.
+    It takes a list of rows (and runs the code from `source`), or a
+    `Store` (or a columnar `Tab`), where it works one rule at a time
+    on whole columns, on the rows not matched so far.
+    """
+    env = {}
+    exec(i.source(), env)
+    rules, run = i.rules(), env["leafs"]
+
+    def columns(s):
+      last = len(rules)
+      out, todo = [last] * s.n, range(s.n)
+      for k, (pos, lo, hi, num) in enumerate(rules):
+        d, ok = s.data[pos], s.ok[pos]
+        if not num:
+          lo = hi = s.codes[pos].get(lo, -1)
+        for j in todo:
+          if ok[j] and lo <= d[j] <= hi:
+            out[j] = k
+        todo = [j for j in todo if out[j] == last]
+      return out
+
+    def leafs(x):
+      if isinstance(x, Tab):
+        x = x.rows
+      if isinstance(x, Rows):
+        x = x.store
+      return columns(x) if isinstance(x, Store) else run(x)
+    return leafs
+
   def show(i, pre=""):
     if i.kid:
       print(pre + "if", i.txt, " in ",
@@ -199,3 +1063,8 @@ class DecisionList(Thing):
       m = len(i.leaf.rows)
       if m > 0:
         print("else", i.leaf.status(), len(i.leaf.rows))
+
+
+def scores(txt, all, presorted):
+  "Worker for `DecisionList`: score the ranges of one column."
+  return [one.s() for one in Ranges(txt, all, presorted=presorted).ranges]
@@ -9,6 +9,8 @@ from .my import *
 from .rx import *
 from .ranges import *
 from .xomo import *
+from .ingest import *
+from .bits import *
 from .test import Test, go
 
 
@@ -267,3 +269,621 @@ def test_rxs():
     if n > 0:
       assert(one.med >= all[n - 1].med)
       assert(one.rank >= all[n - 1].rank)
+
+
+@go
+def test_store():
+  "Columnar tables hold the same rows as list-based tables."
+  from .data import auto93
+  t1 = Tab().read(auto93)
+  t2 = Tab(columnar=True).read(auto93)
+  assert(len(t1.rows) == len(t2.rows))
+  for r1, r2 in zip(t1.rows, t2.rows):
+    assert(r1 == list(r2))
+  assert(t1.mid() == t2.mid())
+  assert(t2.rows[-1] == t1.rows[-1])
+  assert(10 == len(t2.clone(t2.rows[:10]).rows))
+  assert(15 == len(Tree(t2, cols="y").leaves))
+  assert(len({t2.rows[0], t2.rows[0], t2.rows[1]}) == 2)
+  assert(t2.rows[0] not in [None, 1] and t2.rows[0] in [None, t1.rows[0]])
+  d = Dist(t2, rows=t2.rows[:20])
+  assert(all(rid(r) != rid(t2.rows[3]) for _, r in d.neighbors(t2.rows[3])))
+  assert(19 == len(d.neighbors(t2.rows[3])))
+
+
+@go
+def test_save():
+  "Save a table to a binary file, then load it back."
+  from .data import auto93
+  import os
+  import tempfile
+  t1 = Tab().read(auto93)
+  with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "auto93.tab")
+    t1.save(path)
+    for mmap in [True, False]:
+      t2 = Tab.load(path, mmap=mmap)
+      assert(t1.mid() == t2.mid())
+      assert(len(t1.rows) == len(t2.rows))
+      assert(t1.schema().__dict__ == t2.schema().__dict__)
+      for r1, r2 in zip(t1.rows, t2.rows):
+        assert(r1 == list(r2))
+      for c1, c2 in zip(t1.cols.all, t2.cols.all):
+        assert(c1.n == c2.n and c1.txt == c2.txt)
+      t2.add(t1.rows[0])
+      assert(len(t2.rows) == 1 + len(t1.rows))
+      assert(t2.rows.store._mm is None)
+      t2.close()
+    t2 = Tab.load(path)
+    assert(not t2.rows.store._mm.closed)
+    t2.close()
+    with Store.load(path)[0] as s:
+      assert(s.row(0) == t1.rows[0])
+    assert(s._mm is None)
+    again = os.path.join(tmp, "again.tab")
+    t2 = Tab.load(path)
+    t2.save(again)
+    t2.close()
+    t3 = Tab.load(again)
+    assert(t1.mid() == t3.mid())
+    assert(all(r1 == list(r3) for r1, r3 in zip(t1.rows, t3.rows)))
+    t3.close()
+    no = dict(goal=False, klass=False, less=False)
+    s = Schema(["a", "b"], [dict(no, num=True),
+                            dict(no, num=False, goal=True, klass=True)])
+    assert(s.nums == [0] and s.y == [1] and s.klas == 1)
+    t4 = Tab()
+    t4.use(s)
+    [t4.add([n, n % 3]) for n in range(10)]
+    t4.save(again)
+    t5 = Tab.load(again)
+    assert(t5.schema().__dict__ == s.__dict__)
+    assert(t5.cols.all[1].seen == t4.cols.all[1].seen == {0: 4, 1: 3, 2: 3})
+    assert(t5.rows[0] == [0, 0])
+    t5.close()
+
+
+@go
+def test_batches():
+  "Bulk reading gives the same rows as `rows` and `cols`."
+  from .data import weather4
+  import os
+  import tempfile
+  fd, path = tempfile.mkstemp(suffix=".csv")
+  with os.fdopen(fd, "w") as fp:
+    fp.write(weather4 + "# a comment\n")
+  old = list(cols(rows(path)))
+  new = [row for batch in batches(path, size=64) for row in batch]
+  os.remove(path)
+  assert(old[0] == new[0] == ["outlook", "$temp", "wind", "!play"])
+  assert(len(old) == len(new) == 15)
+  for r1, r2 in zip(old[1:], new[1:]):
+    assert(r1[0] == r2[0] and float(r1[1]) == r2[1])
+  assert(4 == Tab().read(weather4).cols.x[0].seen["overcast"])
+
+
+@go
+def test_jobs():
+  "Reading with many processes is the same as reading with one."
+  from .data import auto93
+  import os
+  import tempfile
+  ties = "a,$b\n" + "".join(f"{s},{k}\n" for k, s in enumerate("yxzxyz" * 9))
+  for data in [auto93, ties]:
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    with os.fdopen(fd, "w") as fp:
+      fp.write(data)
+    t1 = Tab().read(path)
+    t2 = Tab().read(path, jobs=3)
+    os.remove(path)
+    assert(t1.rows == t2.rows)
+    for c1, c2 in zip(t1.cols.all, t2.cols.all):
+      assert(c1.n == c2.n)
+      if c1.pos in t1.cols.nums:
+        assert((c1.lo, c1.hi) == (c2.lo, c2.hi))
+        assert(abs(c1.mu - c2.mu) <= 10**-9 * abs(c1.mu))
+      else:
+        assert((c1.seen, c1.mode) == (c2.seen, c2.mode))
+  assert(t1.cols.all[0].mode == "x")
+
+
+@go
+def test_schema():
+  "Clones share their parent's schema, and summarize rows the same."
+  from .data import auto93
+  t = Tab().read(auto93)
+  head, rows = [c.txt for c in t.cols.all], t.rows[100:200]
+  t1, t2, t3 = t.clone(rows), Tab(), Tab()
+  t2.use(t.schema())
+  [t2 + row for row in rows]
+  [t3 + row for row in [head] + rows]
+  assert(t1.schema() is t2.schema() is t.schema() is t.view([0]).schema())
+  assert(t3.schema() is not t.schema())
+  assert(t3.schema().__dict__ == t.schema().__dict__)
+  for one in [t1, t2]:
+    assert(list(one.cols.x) == list(t3.cols.x))
+    assert(list(one.cols.y) == list(t3.cols.y))
+    for c1, c3 in zip(one.cols.all, t3.cols.all):
+      assert((c1.n, c1.w, c1.txt) == (c3.n, c3.w, c3.txt))
+      if c1.pos in t3.cols.nums:
+        assert((c1.mu, c1.m2, c1.lo, c1.hi) == (c3.mu, c3.m2, c3.lo, c3.hi))
+      else:
+        assert((c1.seen, c1.mode) == (c3.seen, c3.mode))
+
+
+@go
+def test_view():
+  "Views hold no rows, and summarize them only when asked."
+  from .data import auto93
+  t = Tab().read(auto93)
+  v = t.view(range(0, 100)).view(range(50, 100))
+  assert(v._cols is None)
+  assert(t.rows[50:100] == list(v.rows))
+  assert(t.clone(t.rows[50:100]).mid() == v.mid())
+  assert(v._cols is not None)
+
+
+@go
+def test_sketch():
+  "Sketched percentiles are close to the exact ones."
+  from .data import auto93
+  import bisect
+  t = Tab().read(auto93)
+  for c in t.cols.nums.values():
+    assert(c.some is None)
+    exact, some = Num(c.pos, c.txt).keep("all"), Num(c.pos, c.txt).keep()
+    for _ in range(25):
+      for row in t.rows:
+        if row[c.pos] != "?":
+          exact + row[c.pos]
+          some + row[c.pos]
+    exact.some.sort()
+    assert(len(some.some.all) < 1000 < exact.n)
+    assert(abs(some.sd() - c.sd()) < 0.01 * c.sd())
+    for p in [.1, .25, .5, .75, .9]:
+      x = some.quantile(p)
+      lo = bisect.bisect_left(exact.some, x) / exact.n
+      hi = bisect.bisect_right(exact.some, x) / exact.n
+      assert(lo - 0.01 <= p <= hi + 0.01)
+
+
+@go
+def test_heavy():
+  "Bounded symbol counts still find the frequent symbols."
+  k, my.K = my.K, 32
+  try:
+    a = []
+    for n in range(10**4):
+      r = random.random()
+      a += [["a" if r < .3 else "b" if r < .5 else str(n), r < .3]]
+    s = Sym(0, "id")
+    [s + x for x, _ in a]
+    assert(s.mode == "a" and len(s.seen) <= 32)
+    b = sum(x == "b" for x, _ in a)
+    assert(s.seen["b"] - s.over.get("b", 0) <= b <= s.seen["b"])
+    r = Ranges("id", a)
+    assert(len(r.ranges) <= 32 and r.all.n == 10**4)
+    assert(max(r.ranges, key=lambda z: z.s()).lo == "a")
+    a = ["x"] * 100 + [str(n) for n in range(100)]
+    b = ["x"] * 5 + [str(n) for n in range(100, 1100)]
+    s1, s2 = Sym(0, "id"), Sym(0, "id")
+    [s1 + x for x in a]
+    [s2 + x for x in b]
+    s1.merge(s2)
+    assert(len(s1.seen) <= 32 and s1.n == len(a + b))
+    assert(s1.seen["x"] - s1.over["x"] <= 105 <= s1.seen["x"])
+  finally:
+    my.K = k
+
+
+@go
+def test_dists():
+  "Batch distances match the one-pair-at-a-time distances."
+  from .data import auto93
+  t = Tab().read(auto93)
+  rows = t.rows[:40] + [r for r in t.rows if "?" in r]
+  for p in [1, 2, 3]:
+    d = Dist(t, cols={**t.cols.x, **t.cols.y}, p=p)
+    for r1, ds in zip(rows, d.pairwise(rows, rows)):
+      for r2, x in zip(rows, ds):
+        assert(abs(x - d.dist(r1, r2)) < 10**-9)
+    for r1 in rows[:5]:
+      for x, r2 in zip(d.dists(r1), d.rows):
+        assert(abs(x - d.dist(r1, r2)) < 10**-9)
+
+
+@go
+def test_cache():
+  "Cached distances are the same, and get reused."
+  from .data import auto93
+  c = Cache(2)
+  c.put("a", 1), c.put("b", 2), c.get("a"), c.put("c", 3)
+  assert(c.get("b") is None and c.get("a") == 1 and c.hits == 2)
+  random.seed(my.r)
+  n1 = [len(leaf.t.rows) for leaf in Tree(Tab().read(auto93)).leaves]
+  size, my.C = my.C, 10**5
+  try:
+    random.seed(my.r)
+    tree = Tree(Tab().read(auto93))
+    assert(n1 == [len(leaf.t.rows) for leaf in tree.leaves])
+    assert(tree.dist.cache.hits > 0 and tree.dist.cache.misses > 0)
+  finally:
+    my.C = size
+  t1, t2 = Tab().read(auto93), Tab(columnar=True).read(auto93)
+  for t in [t1, t2]:
+    d1, d2 = Dist(t), Dist(t, cache=Cache())
+    for k in range(50):
+      for r1, r2 in [(list(t.rows[k]), t.rows[5]),
+                     (t1.rows[k], t2.rows[5]), (t2.rows[k], t1.rows[5])]:
+        assert(d2.dist(r1, r2) == d1.dist(r1, r2))
+        assert(d2.dists(r1, [r2]) == [d1.dist(r1, r2)])
+
+
+@go
+def test_vptree():
+  "Indexed nearest and far rows agree with a full scan."
+  from .data import auto93
+  t = Tab().read(auto93)
+  d1 = Dist(t, rows=t.rows)
+  d2 = Dist(t, rows=t.rows, index=True)
+  vp = d2._index
+  for r1 in t.rows[:20]:
+    want = [d for d, _ in d1.neighbors(r1)]
+    assert([d for d, _ in d2.nearest(r1, 5)] == want[:5])
+    far = vp.far(r1, budget=len(t.rows) + 1)
+    assert(d1.dist(r1, d1.faraway(r1)) == d1.dist(r1, far))
+    x = d1.dist(r1, vp.far(r1, budget=64))
+    assert(want.index(x) > 0.6 * len(want))
+  n, kernel = [0], d2.kernel
+
+  def counted(v, m):
+    n[0] += len(m[0]) if m else 0
+    return kernel(v, m)
+  d2.kernel = counted
+  for r1 in t.rows[:20]:
+    n[0], want = 0, [d for d, _ in d1.neighbors(r1)]
+    x = d1.dist(r1, d2.faraway(r1))
+    assert(want.index(x) > 0.6 * len(want))
+    assert(n[0] <= my.Ib * len(t.rows)**0.5 < len(t.rows) / 4)
+
+
+@go
+def test_tree_jobs():
+  "Trees grown with seeded splits are the same, however many jobs."
+  from .data import auto93
+  depth, my.z = my.z, 1
+  try:
+    t = Tab().read(auto93)
+    random.seed(10)
+    x = random.random()
+    random.seed(10)
+    trees = [Tree(t, jobs=n, seeded=n == 1) for n in [1, 1, 2, 3]]
+    assert(random.random() == x)
+    one, two = trees[0], trees[2]
+    for tree in trees:
+      assert(len(tree.leaves) == len(one.leaves) > 4)
+      mids = [leaf.t.mid() for leaf in tree.leaves]
+      doms = [leaf.dom for leaf in tree.leaves]
+      assert(mids == [leaf.t.mid() for leaf in one.leaves])
+      assert(doms == [leaf.dom for leaf in one.leaves])
+    assert(two.root.kids[0]._root is two and not two._pending)
+    sizes = []
+    for n in [None, 1]:
+      random.seed(my.r)
+      tree = Tree(Tab().read(auto93), jobs=n)
+      sizes += [[len(leaf.t.rows) for leaf in tree.leaves]]
+    assert(sizes[0] == sizes[1])
+  finally:
+    my.z = depth
+
+
+@go
+def test_insert():
+  """Rows inserted into a tree land in leaves, which grow, then split.
+  (Re-inserting old rows keeps the ranges of the goals the same, so
+  updated `dom` counts should equal a recount from scratch.)"""
+  from .data import auto93
+  rows = Tab().read(auto93).rows[:200]
+  tree = Tree(Tab().read(auto93).clone(rows), jobs=1)
+  n = len(tree.leaves)
+  for row in rows[:20]:
+    leaf = tree.insert(row)
+    assert(not leaf.kids and leaf.t.rows[-1] == row)
+  tree.insert_many(rows * 3)
+  t = tree.root.t
+  assert(len(t.rows) == 4 * len(rows) + 20)
+  assert(len(t.rows) == sum(len(j.t.rows) for j in tree.leaves))
+  assert(len(tree.leaves) > n)
+  assert([j.id for j in tree.leaves] == list(range(len(tree.leaves))))
+  for j in tree.leaves:
+    assert(j.dom == sum([t.better(j.t.mid(), k.t.mid())
+                         for k in tree.leaves]))
+
+
+@go
+def test_insert_wider():
+  """Rows inserted beyond the old range of a goal rescale every leaf,
+  and every distance."""
+  from .data import auto93
+  rows = Tab().read(auto93).rows[:200]
+  tree = Tree(Tab().read(auto93).clone(rows), jobs=1)
+  t = tree.root.t
+  wider = [c.pos for c in t.cols.all if c.txt in [">weight", "$horsepower"]]
+  tree.dist.mat()
+  new = []
+  for row in rows[:60]:
+    new += [list(row)]
+    for pos in wider:
+      new[-1][pos] *= 3
+  tree.insert_many(new)
+  for j in tree.leaves:
+    assert(j.dom == sum([t.better(j.t.mid(), k.t.mid())
+                         for k in tree.leaves]))
+  row = tree.dist.rows[0]
+  for d, r in zip(tree.dist.dists(row), tree.dist.rows):
+    assert(abs(d - tree.dist.dist(row, r)) < 0.0001)
+
+
+@go
+def test_export():
+  "Exported trees route each row of each leaf back to that leaf."
+  from .data import auto93
+  import os
+  import tempfile
+  tree = Tree(Tab().read(auto93), jobs=1)
+  path = os.path.join(tempfile.mkdtemp(), "tree.json")
+  tree.export(path)
+  r = Router.load(path)
+  assert(len(r.leaves) == len(tree.leaves))
+  for leaf in tree.leaves:
+    assert(r.leaves[leaf.id]["dom"] == leaf.dom)
+    assert(set(r.route(leaf.t.rows)) == {leaf.id})
+
+
+@go
+def test_rank():
+  "Fast leaf ranking agrees with `better`; fronts respect domination."
+  from .data import auto93
+  t = Tab().read(auto93)
+  es = t.exps(t.rows[:50])
+  for a, r1 in zip(es, t.rows[:50]):
+    for b, r2 in zip(es, t.rows[:50]):
+      assert(beats(a, b) == t.better(r1, r2))
+  tree = Tree(t, jobs=1)
+  for j in tree.leaves:
+    assert(j.dom == sum([t.better(j.t.mid(), k.t.mid())
+                         for k in tree.leaves]))
+  most, my.nds = my.nds, 0
+  try:
+    tree.rank()
+  finally:
+    my.nds = most
+  cs = list(t.cols.y.values())
+  gs = {id(j): [c.w * c.norm(j.t.mid()[c.pos]) for c in cs]
+        for j in tree.leaves}
+  for j in tree.leaves:
+    for k in tree.leaves:
+      a, b = gs[id(j)], gs[id(k)]
+      if a != b and all(x >= y for x, y in zip(a, b)):
+        assert(j.dom > k.dom)
+
+
+@go
+def test_dom_counts():
+  "Bulk domination counts match `better`; samples come close."
+  from .data import auto93
+  t = Tab().read(auto93)
+  some = t.rows[:60]
+  m = t.better_matrix(some)
+  assert(m == [[t.better(r1, r2) for r2 in some] for r1 in some])
+  assert(t.better_matrix(some[:5], some) == m[:5])
+  assert(t.dom_counts(some) == [sum(row) for row in m])
+  assert(t.clone().dom_counts() == t.dom_counts([]) == [])
+  exact = t.dom_counts()
+  random.seed(my.r)
+  guess = t.dom_counts(sample=100)
+  n = len(t.rows)
+  assert(sum(abs(x - y) for x, y in zip(exact, guess)) / n < 0.1 * n)
+
+
+class _Unsorted(DecisionList):
+  "Worker for the tests: a `DecisionList` that never presorts."
+  def presort(i, *lst):
+    s = super().presort(*lst)
+    s.idx = {}
+    return s
+
+
+def _decisions(d):
+  "Worker for the tests: the choices made down a decision list."
+  out = []
+  while d.kid:
+    out += [(d.txt, d.decide.lo, d.decide.hi, len(d.leaf.rows))]
+    d = d.kid
+  return out + [len(d.leaf.rows)]
+
+
+@go
+def test_presort():
+  "Decision lists made with presorted columns make the same choices."
+  from .data import auto93
+  random.seed(my.r)
+  best, rest, _ = Tree(Tab().read(auto93)).bore()
+  d1, d2 = DecisionList(best, rest), _Unsorted(best, rest)
+  assert(d1._sorts.idx and not d2._sorts.idx)
+  assert(_decisions(d1) == _decisions(d2) and len(_decisions(d1)) > 1)
+
+
+@go
+def test_decision_jobs():
+  "Decision lists made with many jobs make the same choices."
+  from .data import auto93
+  random.seed(my.r)
+  best, rest, _ = Tree(Tab().read(auto93)).bore()
+  d1, d2 = DecisionList(best, rest), DecisionList(best, rest, jobs=2)
+  assert(_decisions(d1) == _decisions(d2))
+
+
+@go
+def test_compile():
+  "Compiled decision lists find the same leaves as a walk down the list."
+  from .data import auto93
+  random.seed(my.r)
+  t = Tab().read(auto93)
+  best, rest, _ = Tree(t).bore()
+  d = DecisionList(best, rest)
+  want = []
+  for row in t.rows:
+    k, one = 0, d
+    while one.kid and not one.decide.matches(row):
+      k, one = k + 1, one.kid
+    want += [k]
+  assert(len(set(want)) > 1)
+  f = d.compile()
+  assert(f(t.rows) == want)
+  env = {}
+  exec(d.source("where"), env)
+  assert(env["wheres"](t.rows) == want)
+  t2 = Tab(columnar=True)
+  t2 + t.cols.schema.names
+  [t2 + row for row in t.rows]
+  assert(f(t2) == want)
+
+
+@go
+def test_bits():
+  "Bitmap indexes find the rows in ranges, and the same decisions."
+  from .data import auto93
+  random.seed(my.r)
+  t = Tab().read(auto93)
+  assert(members(bitset([3, 0, 64, 9], 70)) == [0, 3, 9, 64])
+  assert(popcount(bitset(range(0, 100, 3), 100)) == 34)
+  idx = Index(t.rows)
+  for col in t.cols.x.values():
+    all = [[row[col.pos], True] for row in t.rows]
+    for r in Ranges(col.txt, all, get=col.pos).ranges:
+      want = [row for row in t.rows if r.matches(row)]
+      b = idx.of(col.pos, r.lo, r.hi, Magic.nump(col.txt))
+      assert(idx.select(b) == want and popcount(b) == r.n)
+  best, rest, _ = Tree(t).bore()
+  d1, d2 = DecisionList(best, rest), DecisionList(best, rest, bits=True)
+  assert(d2._sorts.index and _decisions(d1) == _decisions(d2))
+
+
+@go
+def test_range_arrays():
+  "Bins kept in arrays give the same ranges as bins kept as objects."
+  def ranges(a):
+    return [(r.n, r.yes, r.no, r.lo, r.hi, r.gen)
+            for r in Ranges("$t", a).ranges]
+  n = 10**3
+  tests = [[[i, i > 10] for i in range(20)],
+           [[i, .1 * n < i < .2 * n or i > .7 * n] for i in range(n)],
+           [[i, 0 if random.random() < 0.5 else 1] for i in range(n)],
+           [[i, 0] for i in range(n)],
+           [[1, 0] for i in range(100)],
+           [[random.random()**2, random.random() < .3] for _ in range(n)],
+           [[int(10 * random.random()), random.random() < .6]
+            for _ in range(n)],
+           [["?", True], [1, True]], []]
+  old = my.R
+  try:
+    for a in tests:
+      my.R = "objects"
+      want = ranges(a)
+      my.R = "arrays"
+      assert(ranges(a) == want)
+  finally:
+    my.R = old
+
+
+@go
+def test_range_heap():
+  "Merging bins best first finds as many ranges as merging in passes."
+  old = my.Rm
+  my.Rm = "heap"
+  try:
+    for f in [test_range1, test_range2, test_range3, test_range4,
+              test_range5, test_range6, test_range7]:
+      f()
+  finally:
+    my.Rm = old
+
+
+@go
+def test_range_stream():
+  "Streamed values (in any order), in bounded memory, find the same ranges."
+  from .ranges import Stream
+  n = 10**4
+  a = [[i, i > .1 * n and i < .2 * n or i > .6 * n and i < .7 * n]
+       for i in range(n)]
+  random.seed(my.r)
+  random.shuffle(a)
+  s = Stream("$x", k=64)
+  for x, y in a:
+    s.add(x, y)
+  assert len(s.bins) <= 64
+  assert s.all.n == Ranges("$x", a).all.n
+  assert len(s.ranges) == len(Ranges("$x", a).ranges) == 5
+  a = [["a", 1], ["b", 0], ["a", 1], ["?", 1]]
+  s = Stream("x")
+  for x, y in a:
+    s.add(x, y)
+  assert [(r.lo, r.n) for r in s.ranges] == [
+      (r.lo, r.n) for r in Ranges("x", a).ranges]
+  s = Stream("x", k=8)
+  for n in range(5000):
+    s.add("a" if n % 3 else str(n), n % 2)
+  assert len(s.seen) <= 8 and len(s.sym.seen) <= 8
+  assert s.all.n == 5000 and s.seen["a"].n == s.sym.seen["a"]
+
+
+@go
+def test_range_many():
+  "Ranges for many goals (sorted once) match those found one at a time."
+  n = 10**4
+  a = [[i, ("a" if i < .3 * n else "b" if i < .8 * n else "c",
+            i > .1 * n and i < .2 * n or i > .7 * n)] for i in range(n)]
+  random.seed(my.r)
+  random.shuffle(a)
+
+  def same(r1, r2):
+    def seen(r): return [(z.lo, z.hi, z.n, z.yes, z.no) for z in r.ranges]
+    return seen(r1) == seen(r2)
+  for how in ["arrays", "objects"]:
+    old, my.R = my.R, how
+    try:
+      r1, r2 = Ranges.many("$x", a, ["b", True])
+      assert same(r1, Ranges("$x", [(x, y[0]) for x, y in a], "b"))
+      assert same(r2, Ranges("$x", [(x, y[1]) for x, y in a], True))
+      for r, k in zip(Ranges.many("$x", [(x, y[0]) for x, y in a], "abc"),
+                      "abc"):
+        assert same(r, Ranges("$x", [(x, y[0]) for x, y in a], k))
+    finally:
+      my.R = old
+
+
+@go
+def test_bootstrap_bulk():
+  "Bootstraps drawn in bulk, or in a loop, agree (on the `rxs` data)."
+  n = 64
+  d = dict(x1=[0.34, 0.49, 0.51, 0.6] * n,
+           x2=[0.6, 0.7, 0.8, 0.89] * n,
+           x3=[0.13, 0.23, 0.33, 0.35] * n,
+           x4=[0.6, 0.7, 0.8, 0.9] * n,
+           x5=[0.1, 0.2, 0.3, 0.4] * n)
+  rxs = [Rx(rx=k, all=d[k]) for k in d]
+  old = my.Sboot
+  try:
+    for one in rxs:
+      for two in rxs:
+        if one.rx < two.rx:
+          my.Sboot = "loop"
+          want = one.bootstrap(two)
+          my.Sboot = "bulk"
+          assert want == one.bootstrap(two), (one.rx, two.rx)
+  finally:
+    my.Sboot = old
+  lst = [1, 2, 3]
+  some = resample(lst, 3 * 10**5)
+  assert len(some) == 3 * 10**5 and set(some) == set(lst)